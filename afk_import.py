@@ -0,0 +1,49 @@
+import csv
+import io
+import json
+
+IMPORT_FIELDS = ["user_id", "start_date", "start_time", "end_date", "end_time", "reason"]
+IMPORT_FORMATS = ("csv", "json")
+
+def read_import_file(filename: str, data: bytes):
+    """
+    Read AFK entries from a CSV file with a header row or a JSON array of objects
+
+    Both formats use the IMPORT_FIELDS keys; an optional clan_role_id picks
+    the clan instead of the member's current clan role.
+
+    Returns:
+        List of (line number, dict of str values), the line number being the
+        CSV line or the 1-based position in the JSON array
+    """
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError("The file must be a .csv or .json file")
+
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError("The file must be UTF-8 encoded")
+
+    if extension == 'csv':
+        reader = csv.DictReader(io.StringIO(text, newline=''))
+        rows = [(reader.line_num, row) for row in reader]
+        fields = reader.fieldnames or []
+    else:
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("The JSON file must contain an array of objects")
+        rows = list(enumerate(items, start=1))
+        fields = set().union(*items) if items else IMPORT_FIELDS
+
+    missing = [field for field in IMPORT_FIELDS if field not in fields]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    return [
+        (line, {key: "" if value is None else str(value).strip() for key, value in row.items() if key is not None})
+        for line, row in rows
+    ]
@@ -0,0 +1,180 @@
+import bisect
+import threading
+from typing import NamedTuple, Optional
+
+class AfkEntry(NamedTuple):
+    id: int
+    user_id: int
+    display_name: str
+    start_date: int
+    end_date: int
+    reason: str
+    created_at: int
+    clan_role_id: int
+
+class ActiveAfkIndex:
+    """
+    In-memory index of active AFK entries
+
+    Entries are kept in two sorted lists, one by (start_date, end_date, id)
+    and one by (end_date, start_date, id), per clan and across all clans.
+    "Starts after T" is a slice of the start list: O(log n + k). "Not ended
+    at T" is a slice of the end list that is re-sorted into start order:
+    O(log n + k log k). "Active at T" needs both bounds; it bisects both
+    lists and walks the shorter candidate slice, sorting only the matches
+    when that is the end list. Ended entries are removed as they expire, so
+    for the current time the candidates are little beyond the matches.
+
+    Adding or removing an entry is a binary search plus a list insert or
+    delete, which moves the tail of each list: O(n), but a memmove of n
+    pointers, cheap for the few thousand entries a guild has active.
+    Database keeps the index in sync after every committed write.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}  # entry id -> AfkEntry
+        self._by_user = {}  # user id -> set of entry ids
+        self._by_clan = {}      # clan role id -> sorted [(start_date, end_date, entry id)]
+        self._by_clan_end = {}  # clan role id -> sorted [(end_date, start_date, entry id)]
+        self._all = []          # sorted [(start_date, end_date, entry id)] across all clans
+        self._all_end = []      # sorted [(end_date, start_date, entry id)] across all clans
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_listener(self, callback):
+        """Call callback(entry) whenever an entry is added, on the thread that adds it"""
+        self._listeners.append(callback)
+
+    def load(self, entries):
+        """Replace the index contents with the given entries"""
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self._by_clan.clear()
+            self._by_clan_end.clear()
+            self._all.clear()
+            self._all_end.clear()
+            for entry in entries:
+                self.add(entry)
+
+    def add(self, entry: AfkEntry):
+        """Add an active entry"""
+        with self._lock:
+            if entry.id in self._entries:
+                self.remove(entry.id)
+            key = (entry.start_date, entry.end_date, entry.id)
+            self._entries[entry.id] = entry
+            self._by_user.setdefault(entry.user_id, set()).add(entry.id)
+            end_key = (entry.end_date, entry.start_date, entry.id)
+            bisect.insort(self._by_clan.setdefault(entry.clan_role_id, []), key)
+            bisect.insort(self._by_clan_end.setdefault(entry.clan_role_id, []), end_key)
+            bisect.insort(self._all, key)
+            bisect.insort(self._all_end, end_key)
+        for callback in self._listeners:
+            callback(entry)
+
+    def remove(self, entry_id: int) -> Optional[AfkEntry]:
+        """Remove an entry by id, returning it if it was indexed"""
+        with self._lock:
+            entry = self._entries.pop(entry_id, None)
+            if entry is None:
+                return None
+
+            user_entries = self._by_user[entry.user_id]
+            user_entries.discard(entry_id)
+            if not user_entries:
+                del self._by_user[entry.user_id]
+
+            key = (entry.start_date, entry.end_date, entry.id)
+            end_key = (entry.end_date, entry.start_date, entry.id)
+            for by_clan, clan_key in ((self._by_clan, key), (self._by_clan_end, end_key)):
+                clan_entries = by_clan[entry.clan_role_id]
+                del clan_entries[bisect.bisect_left(clan_entries, clan_key)]
+                if not clan_entries:
+                    del by_clan[entry.clan_role_id]
+            del self._all[bisect.bisect_left(self._all, key)]
+            del self._all_end[bisect.bisect_left(self._all_end, end_key)]
+            return entry
+
+    def remove_user(self, user_id: int):
+        """Remove every entry of a user, returning the removed entries"""
+        with self._lock:
+            return [self.remove(entry_id) for entry_id in list(self._by_user.get(user_id, ()))]
+
+    def remove_ended(self, when: int):
+        """Remove every entry whose end_date is at or before when, returning the removed entries"""
+        with self._lock:
+            ended = self._all_end[:bisect.bisect_right(self._all_end, (when, float('inf')))]
+            return [self.remove(entry_id) for _, _, entry_id in ended]
+
+    def end_dates(self):
+        """End dates of all indexed entries"""
+        with self._lock:
+            return [entry.end_date for entry in self._entries.values()]
+
+    def _keys(self, clan_role_id):
+        return self._all if clan_role_id is None else self._by_clan.get(clan_role_id, [])
+
+    def _end_keys(self, clan_role_id):
+        return self._all_end if clan_role_id is None else self._by_clan_end.get(clan_role_id, [])
+
+    def _not_ended(self, when: int, clan_role_id: int = None, started_by: int = None):
+        """
+        (start_date, end_date, entry id) keys with end_date > when, ordered by start_date
+
+        With started_by, only keys with start_date <= started_by, filtered
+        before sorting.
+        """
+        end_keys = self._end_keys(clan_role_id)
+        not_ended = end_keys[bisect.bisect_right(end_keys, (when, float('inf'))):]
+        return sorted(
+            (start, end, entry_id) for end, start, entry_id in not_ended
+            if started_by is None or start <= started_by
+        )
+
+    def active_at(self, when: int, clan_role_id: int = None):
+        """Entries with start_date <= when < end_date, ordered by start_date"""
+        with self._lock:
+            keys = self._keys(clan_role_id)
+            end_keys = self._end_keys(clan_role_id)
+            started = bisect.bisect_right(keys, (when, float('inf')))
+            not_ended = len(end_keys) - bisect.bisect_right(end_keys, (when, float('inf')))
+
+            # Walk whichever candidate slice is shorter
+            if started <= not_ended:
+                matches = [entry_id for _, end, entry_id in keys[:started] if end > when]
+            else:
+                matches = [entry_id for _, _, entry_id in self._not_ended(when, clan_role_id, started_by=when)]
+            return [self._entries[entry_id] for entry_id in matches]
+
+    def scheduled_after(self, when: int, clan_role_id: int = None):
+        """Entries starting after when, ordered by start_date"""
+        with self._lock:
+            keys = self._keys(clan_role_id)
+            started = bisect.bisect_right(keys, (when, float('inf')))
+            return [self._entries[entry_id] for _, _, entry_id in keys[started:]]
+
+    def current_and_future(self, when: int, clan_role_id: int = None):
+        """Entries that have not ended at when, ordered by start_date"""
+        with self._lock:
+            return [self._entries[entry_id] for _, _, entry_id in self._not_ended(when, clan_role_id)]
+
+    def current_and_future_by_clan(self, when: int, clan_role_ids):
+        """Entries that have not ended at when, grouped by clan"""
+        with self._lock:
+            return {
+                clan_role_id: [self._entries[entry_id] for _, _, entry_id in self._not_ended(when, clan_role_id)]
+                for clan_role_id in clan_role_ids
+            }
+
+    def for_user(self, user_id: int, when: int):
+        """A user's entries that have not ended before when, ordered by start_date"""
+        with self._lock:
+            entries = [self._entries[entry_id] for entry_id in self._by_user.get(user_id, ())]
+        return sorted(
+            (entry for entry in entries if entry.end_date >= when),
+            key=lambda entry: (entry.start_date, entry.id)
+        )
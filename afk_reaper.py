@@ -0,0 +1,81 @@
+import asyncio
+import heapq
+import logging
+import time
+
+class AfkReaper:
+    """
+    Background task that marks AFK entries inactive as soon as they end
+
+    End times of active entries are kept in a min-heap. The task sleeps until
+    the earliest one is due, expires everything that has finished in a single
+    batched UPDATE, and is woken early when a new entry ends sooner than the
+    current deadline.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._heap = []
+        self._wakeup = None
+        self._loop = None
+        self._task = None
+
+    def start(self):
+        """Seed the heap from the active index and start the background task"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        index = self.db.db.active_index
+        index.add_listener(lambda entry: self.schedule(entry.end_date))
+        for end_date in index.end_dates():
+            heapq.heappush(self._heap, end_date)
+
+        self._task = asyncio.create_task(self._run(), name="afk-reaper")
+
+    async def stop(self):
+        """Cancel the background task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, end_date: int):
+        """Register an end time; safe to call from any thread"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._push, end_date)
+
+    def _push(self, end_date: int):
+        if not self._heap or end_date < self._heap[0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, end_date)
+
+    async def _run(self):
+        # Catch up on everything that ended while the bot was offline
+        try:
+            await self.db.expire_finished_afk()
+        except Exception as e:
+            logging.error(f"Error expiring finished AFK entries: {e}")
+
+        while True:
+            now = int(time.time())
+
+            due = False
+            while self._heap and self._heap[0] <= now:
+                heapq.heappop(self._heap)
+                due = True
+
+            if due:
+                try:
+                    await self.db.expire_finished_afk(now)
+                except Exception as e:
+                    logging.error(f"Error expiring finished AFK entries: {e}")
+
+            self._wakeup.clear()
+            timeout = self._heap[0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
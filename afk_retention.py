@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+
+from database import ARCHIVE_BATCH_SIZE, VACUUM_STEP_PAGES
+
+class RetentionJob:
+    """
+    Background task that keeps afk_users small
+
+    Every interval, entries that ended more than retention_days ago are
+    moved to afk_users_archive in batches of batch_size, each its own short
+    transaction, so other writes are never held up for long. Afterwards the
+    free pages left by archived and deleted rows are handed back to the file
+    system with incremental vacuum steps.
+    """
+
+    def __init__(self, db, retention_days: float = None, interval: float = 24 * 3600, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.db = db
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+
+    def start(self):
+        """Start the background task"""
+        self._task = asyncio.create_task(self._run(), name="afk-retention")
+
+    async def stop(self):
+        """Cancel the background task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self):
+        """
+        Archive everything that is due, then shrink the database file
+
+        Returns:
+            (archived entries, freed pages)
+        """
+        archived = 0
+        if self.retention_days is not None:
+            ended_before = int(time.time() - self.retention_days * 86400)
+            last_id = 0
+            while True:
+                ids = await self.db.archive_finished_afk(ended_before, self.batch_size, last_id)
+                archived += len(ids)
+                if len(ids) < self.batch_size:
+                    break
+                last_id = ids[-1]
+                # Let queued writes in between batches
+                await asyncio.sleep(0)
+
+        freed = 0
+        while True:
+            pages = await self.db.incremental_vacuum(VACUUM_STEP_PAGES)
+            freed += pages
+            if pages < VACUUM_STEP_PAGES:
+                break
+            await asyncio.sleep(0)
+
+        if archived or freed:
+            logging.info(f"Retention: archived {archived} AFK entries, freed {freed} database pages")
+        return archived, freed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"Error running AFK retention: {e}")
+            await asyncio.sleep(self.interval)
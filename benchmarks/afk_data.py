@@ -0,0 +1,119 @@
+"""Synthetic afk_users data for the benchmarks"""
+import os
+import random
+import sqlite3
+import time
+
+from database import Database
+
+DAY = 86400
+CLAN_ROLE_IDS = [111111111, 222222222, 333333333]
+REASONS = ["Vacation", "Work trip", "Exams", "Family", "Moving house", "Sick", "Holiday", None]
+
+INSERT_SQL = '''
+    INSERT INTO afk_users
+    (user_id, display_name, start_date, end_date, reason, clan_role_id, created_at, ended_at, is_active)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def user_ids(users: int):
+    """Discord-like user IDs of the synthetic users"""
+    return [10**17 + i * 7919 for i in range(users)]
+
+def generate_afk_rows(
+    rows: int,
+    users: int = None,
+    clan_role_ids=CLAN_ROLE_IDS,
+    current_ratio: float = 0.08,
+    future_ratio: float = 0.04,
+    ended_early_ratio: float = 0.15,
+    now: int = None,
+    seed: int = 0
+):
+    """
+    Yield afk_users rows shaped like a long-running bot's table
+
+    A few users own most of the history (quadratic skew), entries span the
+    last two years and may overlap, some history ended early, and every user
+    has at most one active entry, which is current or in the future.
+
+    Args:
+        rows: Number of rows to generate
+        users: Number of distinct users (defaults to one per ten rows)
+        clan_role_ids: Clans the users are spread over
+        current_ratio: Fraction of users with a current AFK entry
+        future_ratio: Fraction of users with a scheduled AFK entry
+        ended_early_ratio: Fraction of finished entries that ended early
+        now: Reference time in epoch seconds
+        seed: Random seed
+
+    Yields:
+        Tuples in INSERT_SQL column order
+    """
+    rng = random.Random(seed)
+    now = int(time.time()) if now is None else now
+    users = users or max(1, rows // 10)
+    ids = user_ids(users)
+
+    counts = [0] * users
+    for _ in range(rows):
+        counts[int(users * rng.random() ** 2)] += 1
+
+    for index, (user_id, count) in enumerate(zip(ids, counts)):
+        if not count:
+            continue
+        display_name = f"Player{index}"
+        clan_role_id = clan_role_ids[index % len(clan_role_ids)]
+        starts = sorted(now - rng.randrange(1, 730 * DAY) for _ in range(count))
+
+        roll = rng.random()
+        active = "current" if roll < current_ratio else "future" if roll < current_ratio + future_ratio else None
+
+        for number, start in enumerate(starts):
+            duration = int(rng.lognormvariate(11.5, 1.0))  # median ~1.1 days
+            reason = rng.choice(REASONS)
+            is_active = 0
+            ended_at = None
+
+            if number == count - 1 and active == "current":
+                start = now - rng.randrange(1, 3 * DAY)
+                duration = now - start + rng.randrange(3600, 14 * DAY)
+                is_active = 1
+            elif number == count - 1 and active == "future":
+                start = now + rng.randrange(3600, 30 * DAY)
+                is_active = 1
+            elif rng.random() < ended_early_ratio:
+                ended_at = start + int(duration * rng.random())
+
+            created_at = start - rng.randrange(0, 7 * DAY) if start < now else now - rng.randrange(0, DAY)
+            yield (user_id, display_name, start, start + duration, reason, clan_role_id, created_at, ended_at, is_active)
+
+def build_database(path: str, rows: int, seed: int = 0, chunk_size: int = 10000, **options):
+    """
+    Create a database at path with the current schema and rows synthetic entries
+
+    Returns:
+        The user IDs the data was generated for
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    # Let Database create and migrate the schema, then bulk load with plain sqlite3
+    Database(path).close()
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA synchronous = OFF")
+        batch = []
+        with conn:
+            for row in generate_afk_rows(rows, seed=seed, **options):
+                batch.append(row)
+                if len(batch) >= chunk_size:
+                    conn.executemany(INSERT_SQL, batch)
+                    batch.clear()
+            conn.executemany(INSERT_SQL, batch)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    return user_ids(options.get('users') or max(1, rows // 10))
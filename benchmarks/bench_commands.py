@@ -0,0 +1,275 @@
+"""
+Load test of the slash command handlers with stub Discord objects
+
+Usage (from the repository root):
+    python -m benchmarks.bench_commands
+    python -m benchmarks.bench_commands --invocations 5000 --concurrency 1000 --rows 100000 --json commands.json
+    python -m benchmarks.bench_commands --mix afk=1 listafk=4 myafk=4 --write-batch-ms 5
+
+discord_bot is imported with a generated config module pointing at a
+temporary database (optionally prefilled, see benchmarks/afk_data.py).
+The command callbacks are then invoked directly with stub interactions
+whose response and followup record what would have been sent, so no
+Discord connection is needed. Reported per command: handler latency
+percentiles and error count; for the whole run: throughput and event loop
+lag, measured by a task that expects to wake up every --lag-interval.
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime, timedelta
+
+from benchmarks.afk_data import CLAN_ROLE_IDS, build_database, user_ids
+from benchmarks.common import summarize, write_json
+
+ADMIN_ROLE_ID = 900000001
+OFFICER_ROLE_ID = 900000002
+GUILD_ID = 800000001
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str, guild=None):
+        self.id = role_id
+        self.name = name
+        self.guild = guild
+
+    def is_default(self):
+        return False
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = "Benchmark Guild"
+        self.members_by_id = {}
+
+    @property
+    def members(self):
+        return list(self.members_by_id.values())
+
+    @property
+    def member_count(self):
+        return len(self.members_by_id)
+
+    def get_member(self, user_id: int):
+        return self.members_by_id.get(user_id)
+
+class FakeMember:
+    def __init__(self, user_id: int, name: str, roles, guild: FakeGuild):
+        self.id = user_id
+        self.name = name
+        self.nick = None
+        self.global_name = name
+        self.display_name = name
+        self.roles = roles
+        self.guild = guild
+        self.joined_at = None
+
+class FakeMessage:
+    def __init__(self, content=None, **kwargs):
+        self.content = content
+        self.kwargs = kwargs
+
+    async def edit(self, **kwargs):
+        self.kwargs.update(kwargs)
+
+class FakeResponse:
+    """Records interaction responses like discord.InteractionResponse"""
+
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _respond(self):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+
+    async def defer(self, **kwargs):
+        self._respond()
+
+    async def send_message(self, content=None, **kwargs):
+        self._respond()
+        self._interaction.sent.append(FakeMessage(content, **kwargs))
+
+    async def edit_message(self, **kwargs):
+        self._respond()
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        if not self._interaction.response.is_done():
+            raise RuntimeError("Followup sent before the interaction was responded to")
+        message = FakeMessage(content, **kwargs)
+        self._interaction.sent.append(message)
+        return message
+
+class FakeInteraction:
+    def __init__(self, user: FakeMember):
+        self.user = user
+        self.guild = user.guild
+        self.guild_id = user.guild.id
+        self.sent = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def original_response(self):
+        return self.sent[0]
+
+    def failed(self) -> bool:
+        return any(message.content and "❌ An error occurred" in message.content for message in self.sent)
+
+def load_bot(database_file: str, write_batch_ms: float):
+    """Import discord_bot against a generated config module"""
+    config = types.ModuleType("config")
+    config.TOKEN = "benchmark"
+    config.ADMIN_ROLE_ID = ADMIN_ROLE_ID
+    config.OFFICER_ROLE_ID = OFFICER_ROLE_ID
+    config.DATABASE_FILE = database_file
+    config.CLANS = {role_id: f"Clan {number}" for number, role_id in enumerate(CLAN_ROLE_IDS, start=1)}
+    config.DATABASE_WRITE_BATCH_MS = write_batch_ms
+    sys.modules["config"] = config
+    sys.modules.pop("discord_bot", None)
+    return importlib.import_module("discord_bot")
+
+def build_guild(discord_bot, members: int, admin_ratio: float, rng: random.Random) -> FakeGuild:
+    guild = FakeGuild(GUILD_ID)
+    clan_roles = [FakeRole(role_id, f"Clan {number}", guild) for number, role_id in enumerate(CLAN_ROLE_IDS, start=1)]
+    admin_role = FakeRole(ADMIN_ROLE_ID, "Admin", guild)
+
+    for index, user_id in enumerate(user_ids(members)):
+        roles = [clan_roles[index % len(clan_roles)]]
+        if rng.random() < admin_ratio:
+            roles.append(admin_role)
+        guild.members_by_id[user_id] = FakeMember(user_id, f"Player{index}", roles, guild)
+
+    discord_bot.membership.load_guild(guild)
+    return guild
+
+def afk_arguments(rng: random.Random):
+    start = datetime.now() + timedelta(days=rng.randint(1, 20), hours=rng.randint(0, 23))
+    end = start + timedelta(days=rng.randint(1, 10))
+    return (start.strftime("%d%m"), start.strftime("%H%M"), end.strftime("%d%m"), end.strftime("%H%M"), "Load test")
+
+COMMANDS = {
+    "afk": lambda bot, rng: (bot.afk, afk_arguments(rng)),
+    "quickafk": lambda bot, rng: (bot.quickafk, ("Load test", rng.randint(1, 5))),
+    "unafk": lambda bot, rng: (bot.unafk, ()),
+    "listafk": lambda bot, rng: (bot.listafk, ()),
+    "myafk": lambda bot, rng: (bot.myafk, ()),
+}
+
+async def monitor_loop_lag(interval: float, lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def run(discord_bot, guild: FakeGuild, args):
+    rng = random.Random(args.seed)
+    names, weights = zip(*args.mix.items())
+    members = guild.members
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+
+    async def invoke(name):
+        command, arguments = COMMANDS[name](discord_bot, rng)
+        interaction = FakeInteraction(rng.choice(members))
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await command.callback(interaction, *arguments)
+                failed = interaction.failed()
+            except Exception:
+                failed = True
+            latencies[name].append(time.perf_counter() - started)
+        if failed:
+            errors[name] += 1
+
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(args.lag_interval, lags, stop))
+
+    workload = rng.choices(names, weights, k=args.invocations)
+    started = time.perf_counter()
+    await asyncio.gather(*(invoke(name) for name in workload))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+
+    results = {"commands": {}}
+    for name in names:
+        result = summarize(latencies[name])
+        result["errors"] = errors[name]
+        results["commands"][name] = result
+        print(
+            f"{name:<10} n={result['count']:>6} p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+            f"p99={result['p99_ms']:8.2f}ms max={result['max_ms']:8.2f}ms errors={errors[name]}"
+        )
+
+    results["invocations_per_second"] = args.invocations / elapsed if elapsed else 0.0
+    results["loop_lag"] = summarize(lags)
+    print(f"{results['invocations_per_second']:.0f} invocations/s")
+    print(
+        f"event loop lag p50={results['loop_lag']['p50_ms']:.2f}ms p99={results['loop_lag']['p99_ms']:.2f}ms "
+        f"max={results['loop_lag']['max_ms']:.2f}ms"
+    )
+    return results
+
+def parse_mix(items):
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"unknown command {name!r}, choose from {', '.join(COMMANDS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invocations", type=int, default=3000, help="command invocations in total")
+    parser.add_argument("--concurrency", type=int, default=1000, help="invocations running at once")
+    parser.add_argument("--mix", nargs="+", default=["afk=1", "listafk=1", "myafk=1"], help="command=weight pairs")
+    parser.add_argument("--members", type=int, default=2000, help="guild members invoking commands")
+    parser.add_argument("--admin-ratio", type=float, default=0.05, help="fraction of members with the admin role")
+    parser.add_argument("--rows", type=int, default=0, help="prefill the database with this many AFK entries")
+    parser.add_argument("--write-batch-ms", type=float, help="enable the write queue with this batch window")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="event loop lag sampling interval in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="seed for data and workload")
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="afk-commands-") as directory:
+        database_file = os.path.join(directory, "bot.db")
+        if args.rows:
+            # Prefilled users overlap with the guild members, so /myafk and /listafk have data
+            build_database(database_file, args.rows, users=args.members, seed=args.seed, clan_role_ids=CLAN_ROLE_IDS)
+
+        discord_bot = load_bot(database_file, args.write_batch_ms)
+        try:
+            guild = build_guild(discord_bot, args.members, args.admin_ratio, random.Random(args.seed))
+            results = asyncio.run(run(discord_bot, guild, args))
+        finally:
+            discord_bot.bot.db.close()
+
+    if args.json:
+        write_json(args.json, {"args": vars(args), "results": results})
+
+if __name__ == "__main__":
+    main()
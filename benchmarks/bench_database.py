@@ -0,0 +1,164 @@
+"""
+Benchmark of the Database methods on synthetic afk_users tables
+
+Usage (from the repository root):
+    python -m benchmarks.bench_database
+    python -m benchmarks.bench_database --rows 10000 100000 1000000 --json db.json
+    python -m benchmarks.bench_database --baseline db.json --fail-on-regression
+
+For every table size a template database is generated once (see
+benchmarks/afk_data.py) and copied, so write benchmarks never see each
+other's changes. Each method is timed over --iterations calls with random
+users and clans; with --baseline the p50 latencies are compared with a
+previous --json result and methods slower by more than --threshold are
+reported as regressions.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.afk_data import CLAN_ROLE_IDS, build_database, user_ids
+from benchmarks.common import summarize, write_json
+from database import Database
+
+def time_calls(func, arguments) -> dict:
+    latencies = []
+    for args in arguments:
+        started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+def run_size(rows, args):
+    rng = random.Random(args.seed)
+    template = os.path.join(args.data_dir, f"afk_{rows}_{args.seed}.db")
+    if not os.path.exists(template) or args.regenerate:
+        started = time.perf_counter()
+        users = build_database(template, rows, seed=args.seed)
+        print(f"rows={rows:>8} generated in {time.perf_counter() - started:.1f}s")
+    else:
+        users = user_ids(max(1, rows // 10))
+
+    work_file = os.path.join(args.data_dir, "work.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(work_file + suffix):
+            os.remove(work_file + suffix)
+    shutil.copyfile(template, work_file)
+
+    started = time.perf_counter()
+    db = Database(work_file, write_batch_ms=args.write_batch_ms)
+    open_ms = (time.perf_counter() - started) * 1000
+
+    n = args.iterations
+    clans = [(rng.choice(CLAN_ROLE_IDS),) for _ in range(n)]
+    some_users = lambda: [(rng.choice(users),) for _ in range(n)]
+    start = datetime.now() + timedelta(days=1)
+
+    benchmarks = [
+        ("get_all_active_afk", db.get_all_active_afk, clans),
+        ("get_active_afk_for_clans", db.get_active_afk_for_clans, [(CLAN_ROLE_IDS,)] * n),
+        ("get_user_afk_history", db.get_user_afk_history, some_users()),
+        ("get_afk_statistics", db.get_afk_statistics, clans),
+        ("get_afk_statistics_for_clans", db.get_afk_statistics_for_clans, [(CLAN_ROLE_IDS,)] * n),
+        ("get_user_active_afk", db.get_user_active_afk, some_users()),
+        ("set_afk", db.set_afk, [
+            (user_id, "Benchmark", start, start + timedelta(days=2), "Benchmark", rng.choice(CLAN_ROLE_IDS))
+            for (user_id,) in some_users()
+        ]),
+        ("delete_afk_entries", db.delete_afk_entries, [(user_id, False) for (user_id,) in some_users()]),
+        ("delete_afk_entries_all", db.delete_afk_entries, [(user_id, True) for (user_id,) in some_users()]),
+    ]
+
+    results = {"open_ms": open_ms, "methods": {}}
+    try:
+        for name, func, arguments in benchmarks:
+            if args.methods and name not in args.methods:
+                continue
+            result = time_calls(func, arguments)
+            results["methods"][name] = result
+            print(
+                f"rows={rows:>8} {name:<30} "
+                f"p50={result['p50_ms']:8.3f}ms p95={result['p95_ms']:8.3f}ms p99={result['p99_ms']:8.3f}ms"
+            )
+    finally:
+        db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work_file + suffix):
+                os.remove(work_file + suffix)
+    return results
+
+def compare(results, baseline, threshold: float):
+    """
+    Compare p50 latencies with a baseline result
+
+    Returns:
+        List of (rows, method, baseline p50, current p50) slower than threshold times the baseline
+    """
+    regressions = []
+    print(f"\nComparison with baseline (p50, regression above {threshold:.2f}x):")
+    for rows, result in results.items():
+        previous = baseline.get(rows)
+        if previous is None:
+            continue
+        for name, current in result["methods"].items():
+            before = previous["methods"].get(name)
+            if before is None:
+                continue
+            ratio = current["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float('inf')
+            flag = ""
+            if ratio > threshold:
+                regressions.append((rows, name, before["p50_ms"], current["p50_ms"]))
+                flag = "  REGRESSION"
+            print(f"rows={rows:>8} {name:<30} {before['p50_ms']:8.3f}ms -> {current['p50_ms']:8.3f}ms ({ratio:5.2f}x){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="table sizes to test")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per method")
+    parser.add_argument("--methods", nargs="+", help="only run these methods")
+    parser.add_argument("--write-batch-ms", type=float, help="enable the write queue with this batch window")
+    parser.add_argument("--seed", type=int, default=0, help="seed for data and workload")
+    parser.add_argument("--data-dir", help="keep generated databases here and reuse them (default: temporary)")
+    parser.add_argument("--regenerate", action="store_true", help="regenerate databases in --data-dir")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results from an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 ratio counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    # The per-call INFO logging of the write methods would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    temporary = None
+    if args.data_dir is None:
+        temporary = tempfile.TemporaryDirectory(prefix="afk-bench-")
+        args.data_dir = temporary.name
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    try:
+        results = {str(rows): run_size(rows, args) for rows in args.rows}
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    if args.json:
+        write_json(args.json, {"args": vars(args), "results": results})
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{len(regressions)} regression(s)")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
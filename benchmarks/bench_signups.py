@@ -0,0 +1,165 @@
+"""
+End-to-end benchmark of the signup checks against a local Raid-Helper stand-in
+
+Usage (from the repository root):
+    python -m benchmarks.bench_signups
+    python -m benchmarks.bench_signups --sizes 50 5000 --latency 0.2 --error-rate 0.05 --json signups.json
+
+discord_bot is loaded as in benchmarks/bench_commands.py and the real
+/checksignups and /checksignupsweek callbacks are invoked with stub
+interactions, so every check includes the role lookup, the member name
+lookups and building the reply. For every role size they run in four modes:
+    uncached    every check goes to the server
+    revalidate  every check revalidates its cached payload (304 responses)
+    cached      checks are answered from the client's TTL cache
+    week        every check loads five events concurrently (/checksignupsweek)
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.afk_data import CLAN_ROLE_IDS
+from benchmarks.bench_commands import FakeInteraction, FakeRole, build_guild, load_bot
+from benchmarks.common import summarize, write_json
+from benchmarks.fake_raid_helper import FakeRaidHelper
+from messages import Paginator
+from raid_helper import RaidHelperClient
+
+WEEK_EVENTS = 5
+LOAD_ERROR = "Error loading Raid-Helper data"
+
+MODES = {
+    "uncached": dict(cache_size=0),
+    "revalidate": dict(cache_ttl=0),
+    "cached": dict(cache_ttl=3600),
+    "week": dict(cache_size=0),
+}
+
+def sent_text(interaction: FakeInteraction) -> str:
+    """Everything the command replied, every page of a paginated reply included"""
+    parts = []
+    for message in interaction.sent:
+        view = message.kwargs.get("view")
+        if isinstance(view, Paginator):
+            parts.extend(view.page(index) for index in range(view.page_count))
+        else:
+            parts.append(message.content or "")
+    return "".join(parts)
+
+async def run_mode(discord_bot, fake, role, invoker, mode, args):
+    client = RaidHelperClient(
+        base_url=fake.base_url,
+        timeout=args.timeout,
+        retries=args.retries,
+        backoff=0.01,
+        **MODES[mode]
+    )
+    discord_bot.bot.raid_helper = client
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+    errors = 0
+
+    async def check(i):
+        nonlocal failures, errors
+        interaction = FakeInteraction(invoker)
+        async with semaphore:
+            started = time.perf_counter()
+            if mode == "week":
+                event_ids = [str(1000 + (i + offset) % args.events) for offset in range(WEEK_EVENTS)]
+                await discord_bot.checksignupsweek.callback(interaction, role, " ".join(event_ids))
+            else:
+                await discord_bot.checksignups.callback(interaction, role, str(1000 + i % args.events))
+            latencies.append(time.perf_counter() - started)
+        failures += sent_text(interaction).count(LOAD_ERROR)
+        errors += interaction.failed()
+
+    try:
+        # Warm the connection pool (and, for cached modes, the cache) first
+        await asyncio.gather(*(check(i) for i in range(args.events)))
+        latencies.clear()
+        failures = errors = 0
+
+        started = time.perf_counter()
+        await asyncio.gather(*(check(i) for i in range(args.checks)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.close()
+
+    result = summarize(latencies)
+    result.update({
+        "checks_per_second": args.checks / elapsed if elapsed else 0.0,
+        "failed_event_loads": failures,
+        "errors": errors,
+    })
+    return result
+
+async def run(discord_bot, args):
+    results = {}
+    for size in args.sizes:
+        # Members are spread over the clans round-robin; the first clan role is checked
+        guild = build_guild(discord_bot, size * len(CLAN_ROLE_IDS), 0.0, random.Random(args.seed))
+        role = FakeRole(CLAN_ROLE_IDS[0], "Clan 1", guild)
+        member_ids = discord_bot.membership.member_ids(role)
+        invoker = guild.get_member(next(iter(member_ids)))
+
+        fake = FakeRaidHelper(
+            member_ids,
+            signup_ratio=args.signup_ratio,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            slow_rate=args.slow_rate,
+            slow_latency=args.slow_latency,
+            seed=args.seed,
+        )
+        async with fake:
+            for mode in MODES:
+                requests_before = fake.requests
+                result = await run_mode(discord_bot, fake, role, invoker, mode, args)
+                result["server_requests"] = fake.requests - requests_before
+                results.setdefault(str(size), {})[mode] = result
+                print(
+                    f"members={size:>5} {mode:<10} "
+                    f"p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+                    f"{result['checks_per_second']:8.1f} checks/s "
+                    f"requests={result['server_requests']} failed={result['failed_event_loads']} "
+                    f"errors={result['errors']}"
+                )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 1000, 5000], help="role sizes to test")
+    parser.add_argument("--checks", type=int, default=200, help="signup checks per mode")
+    parser.add_argument("--events", type=int, default=10, help="distinct event IDs to cycle through")
+    parser.add_argument("--concurrency", type=int, default=10, help="checks running at once")
+    parser.add_argument("--signup-ratio", type=float, default=0.8, help="fraction of members signed up")
+    parser.add_argument("--latency", type=float, default=0.05, help="server response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="random extra delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of HTTP 500 responses")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of slow responses")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="delay of slow responses in seconds")
+    parser.add_argument("--timeout", type=float, default=10, help="client request timeout in seconds")
+    parser.add_argument("--retries", type=int, default=3, help="client retries per request")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the guild and the signups")
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="afk-signups-") as directory:
+        discord_bot = load_bot(os.path.join(directory, "bot.db"), None)
+        try:
+            results = asyncio.run(run(discord_bot, args))
+        finally:
+            discord_bot.bot.db.close()
+    if args.json:
+        write_json(args.json, {"args": vars(args), "results": results})
+
+if __name__ == "__main__":
+    main()
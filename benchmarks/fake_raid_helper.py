@@ -0,0 +1,116 @@
+"""Local stand-in for the Raid-Helper /api/v2/events/{id} endpoint"""
+import asyncio
+import hashlib
+import json
+import random
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+class FakeRaidHelper:
+    """
+    Serves synthetic Raid-Helper events from a local aiohttp test server
+
+    Every event signs up a deterministic sample of member_ids, so repeated
+    requests for the same event return the same payload (and ETag).
+
+    Args:
+        member_ids: Discord user IDs that events draw their signups from
+        signup_ratio: Fraction of member_ids signed up to each event
+        extra_signups: Signups from users outside member_ids (alts, guests)
+        latency: Base response delay in seconds
+        jitter: Random extra delay in seconds, uniform in [0, jitter]
+        error_rate: Fraction of requests answered with HTTP 500
+        slow_rate: Fraction of requests delayed by slow_latency instead of latency
+        slow_latency: Delay in seconds for slow requests
+        seed: Seed for the synthetic data and the failure injection
+    """
+
+    def __init__(
+        self,
+        member_ids,
+        signup_ratio: float = 0.8,
+        extra_signups: int = 10,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 2.0,
+        seed: int = 0
+    ):
+        self.member_ids = list(member_ids)
+        self.signup_ratio = signup_ratio
+        self.extra_signups = extra_signups
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.seed = seed
+
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+
+        self._random = random.Random(seed)
+        self._events = {}
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to pass to RaidHelperClient"""
+        return str(self._server.make_url("/api/v2"))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v2/events/{event_id}", self._handle_event)
+        self._server = TestServer(app)
+        await self._server.start_server()
+
+    async def close(self):
+        if self._server is not None:
+            await self._server.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def event(self, event_id: str):
+        """The payload and ETag served for an event"""
+        if event_id not in self._events:
+            rng = random.Random(f"{self.seed}:{event_id}")
+            signed_up = rng.sample(self.member_ids, int(len(self.member_ids) * self.signup_ratio))
+            signed_up += [10**17 + rng.randrange(10**9) for _ in range(self.extra_signups)]
+            payload = {
+                "id": event_id,
+                "title": f"Raid {event_id}",
+                "signUps": [
+                    {"userId": str(user_id), "name": f"Player{user_id % 100000}", "status": "primary"}
+                    for user_id in signed_up
+                ],
+            }
+            body = json.dumps(payload)
+            etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+            self._events[event_id] = (body, etag)
+        return self._events[event_id]
+
+    async def _handle_event(self, request: web.Request) -> web.Response:
+        self.requests += 1
+
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if self._random.random() < self.slow_rate:
+            delay = self.slow_latency
+        await asyncio.sleep(delay)
+
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": "injected failure"}, status=500)
+
+        body, etag = self.event(request.match_info["event_id"])
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
@@ -0,0 +1,119 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+# The listener started by setup_logging, stopped by shutdown_logging
+_listener = None
+
+# Name of the app command being handled, attached to every record logged while it runs
+current_command = contextvars.ContextVar('current_command', default=None)
+
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that are not passed through as extra JSON fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+class CommandFilter(logging.Filter):
+    """Adds the current command name to records that do not carry one already"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'command', None) is None:
+            record.command = current_command.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line
+
+    Always has time (UTC, ISO 8601), level, logger and message, plus command
+    when logged during a command and any extra= fields such as duration_ms.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback apart from the message, for the JSON exception field"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(
+    log_file: str = 'bot_database.log',
+    level: int = logging.INFO,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    when: str = None,
+    json_format: bool = True
+) -> logging.handlers.QueueListener:
+    """
+    Route the root logger through a queue to a rotating file and the console
+
+    Logging calls only put the record on a queue; a QueueListener thread
+    formats it and does the file and console I/O. The file rotates at
+    max_bytes, or on the TimedRotatingFileHandler schedule when is given
+    (e.g. 'midnight'). Only the first call configures anything; call
+    shutdown_logging() at exit to flush what is still queued.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(CONSOLE_FORMAT))
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    listener = logging.handlers.QueueListener(queue.SimpleQueue(), file_handler, console_handler)
+
+    queue_handler = _QueueHandler(listener.queue)
+    # Filters run in the thread that logs, where the command context is still set
+    queue_handler.addFilter(CommandFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener.start()
+    _listener = listener
+    return listener
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,161 @@
+from typing import NamedTuple, Optional
+
+class Clan(NamedTuple):
+    role_id: int
+    name: str
+
+class ClanRegistry:
+    """
+    The clans the bot manages, keyed by Discord role ID
+
+    Clans keep the order they are configured in; a member with several clan
+    roles belongs to the first one.
+    """
+
+    def __init__(self, clans):
+        self._clans = {}
+        self._priority = {}
+        for role_id, name in clans:
+            self._priority[role_id] = len(self._clans)
+            self._clans[role_id] = Clan(role_id, name)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the registry from config.CLANS, falling back to CLAN1_ROLE_ID/CLAN2_ROLE_ID"""
+        clans = getattr(config, 'CLANS', None)
+        if clans is None:
+            clans = {
+                config.CLAN1_ROLE_ID: "Requiem Sun",
+                config.CLAN2_ROLE_ID: "Requiem Moon",
+            }
+        return cls(clans.items())
+
+    def __iter__(self):
+        return iter(self._clans.values())
+
+    def __len__(self):
+        return len(self._clans)
+
+    def __contains__(self, role_id):
+        return role_id in self._clans
+
+    def role_ids(self):
+        """Role IDs of all clans in configured order"""
+        return list(self._clans)
+
+    def get(self, role_id: int) -> Optional[Clan]:
+        """The clan for a role ID, or None if the role is not a clan role"""
+        return self._clans.get(role_id)
+
+    def name(self, role_id: int) -> str:
+        """Display name of a clan, tolerating clans that were removed from the config"""
+        clan = self._clans.get(role_id)
+        return clan.name if clan else "Unknown clan"
+
+    def for_roles(self, roles) -> Optional[Clan]:
+        """The clan a member with these roles belongs to, or None"""
+        best = None
+        for role in roles:
+            priority = self._priority.get(role.id)
+            if priority is not None and (best is None or priority < self._priority[best]):
+                best = role.id
+        return self._clans[best] if best is not None else None
+
+class ClanMembership:
+    """
+    Role memberships of guild members, kept current from gateway events
+
+    Maps every role to the IDs of its members and every member to their
+    clan, so clan lookups and role rosters do not scan member or role lists.
+    Members are keyed by (guild ID, user ID); a guild is only answered from
+    the index once it has been loaded with load_guild().
+    """
+
+    def __init__(self, registry: ClanRegistry):
+        self.registry = registry
+        self._roles = {}    # (guild_id, user_id) -> frozenset of role IDs
+        self._members = {}  # role_id -> set of user IDs
+        self._clans = {}    # (guild_id, user_id) -> Clan
+        self._guilds = set()
+
+    def is_loaded(self, guild_id: int) -> bool:
+        return guild_id in self._guilds
+
+    def load_guild(self, guild):
+        """Index every cached member of a guild, replacing what was known about it"""
+        self.remove_guild(guild.id)
+        for member in guild.members:
+            self.update_member(member)
+        self._guilds.add(guild.id)
+
+    def remove_guild(self, guild_id: int):
+        """Forget a guild the bot left or lost"""
+        for key in [key for key in self._roles if key[0] == guild_id]:
+            self._set_roles(key, frozenset())
+        self._guilds.discard(guild_id)
+
+    def update_member(self, member):
+        """Record the current roles of a member (join or role change)"""
+        self._set_roles((member.guild.id, member.id), frozenset(role.id for role in member.roles))
+
+    def remove_member(self, member):
+        """Forget a member that left the guild"""
+        self._set_roles((member.guild.id, member.id), frozenset())
+
+    def remove_role(self, role):
+        """Forget a deleted role"""
+        for user_id in self._members.pop(role.id, ()):
+            key = (role.guild.id, user_id)
+            self._set_roles(key, self._roles.get(key, frozenset()) - {role.id})
+
+    def _set_roles(self, key, role_ids: frozenset):
+        old = self._roles.get(key, frozenset())
+        if old == role_ids:
+            return
+        user_id = key[1]
+
+        for role_id in old - role_ids:
+            members = self._members.get(role_id)
+            if members is not None:
+                members.discard(user_id)
+                if not members:
+                    del self._members[role_id]
+        for role_id in role_ids - old:
+            self._members.setdefault(role_id, set()).add(user_id)
+
+        if role_ids:
+            self._roles[key] = role_ids
+        else:
+            self._roles.pop(key, None)
+
+        clan = self._clan_for_role_ids(role_ids)
+        if clan is not None:
+            self._clans[key] = clan
+        else:
+            self._clans.pop(key, None)
+
+    def _clan_for_role_ids(self, role_ids) -> Optional[Clan]:
+        for clan in self.registry:
+            if clan.role_id in role_ids:
+                return clan
+        return None
+
+    def clan_of(self, member) -> Optional[Clan]:
+        """The clan of a member, from the index when their guild is loaded"""
+        guild = getattr(member, 'guild', None)
+        if guild is not None and guild.id in self._guilds:
+            return self._clans.get((guild.id, member.id))
+        return self.registry.for_roles(getattr(member, 'roles', ()))
+
+    def member_ids(self, role) -> set:
+        """IDs of the members with a role (a copy, safe to modify)"""
+        if role.guild.id in self._guilds:
+            return set(self._members.get(role.id, ()))
+        return {member.id for member in role.members}
+
+    def members(self, role) -> list:
+        """Members with a role, resolved from the guild's member cache"""
+        if role.guild.id not in self._guilds:
+            return list(role.members)
+        get_member = role.guild.get_member
+        return [member for member in map(get_member, self._members.get(role.id, ())) if member is not None]
@@ -8,5 +8,55 @@ TOKEN = 'YOUR_BOT_TOKEN_HERE'
 ADMIN_ROLE_ID = 123456789  # Replace with your admin role ID
 OFFICER_ROLE_ID = 987654321  # Replace with your officer role ID 
 
+# Clan roles (role ID -> display name), listed in priority order.
+# If CLANS is not set, CLAN1_ROLE_ID and CLAN2_ROLE_ID are used as Requiem Sun and Requiem Moon.
+CLAN1_ROLE_ID = 111111111  # Requiem Sun
+CLAN2_ROLE_ID = 222222222  # Requiem Moon
+CLANS = {
+    CLAN1_ROLE_ID: "Requiem Sun",
+    CLAN2_ROLE_ID: "Requiem Moon",
+}
+
 # Database Configuration
-DATABASE_FILE = "bot_database.db"
\ No newline at end of file
+DATABASE_FILE = "bot_database.db"
+
+# Optional: group writes that arrive within this many milliseconds into one commit
+# (None disables the write queue)
+DATABASE_WRITE_BATCH_MS = None
+
+# Optional: trace every database statement; statements slower than this many milliseconds
+# get their query plan logged, /dbtrace lists the most expensive ones (None disables tracing)
+DATABASE_TRACE_MS = None
+
+# Optional: move AFK entries that ended more than this many days ago to the archive table,
+# checked every AFK_RETENTION_INTERVAL_HOURS (None keeps every entry in the main table)
+AFK_RETENTION_DAYS = None
+AFK_RETENTION_INTERVAL_HOURS = 24
+
+# Optional: logging. Records are written by a background thread to LOG_FILE (one JSON object
+# per line, with the command name and duration for app commands, unless LOG_JSON is False)
+# and to the console. The file rotates at LOG_MAX_BYTES, or on a schedule such as
+# 'midnight' when LOG_ROTATE_WHEN is set, keeping LOG_BACKUP_COUNT old files.
+LOG_FILE = "bot_database.log"
+LOG_LEVEL = "INFO"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_ROTATE_WHEN = None
+LOG_JSON = True
+
+# Optional: Raid-Helper API request timeout and event cache lifetime, in seconds
+RAID_HELPER_TIMEOUT = 10
+RAID_HELPER_CACHE_TTL = 60
+
+# Optional: directory where /getmembers also saves discord_usernames.txt and current_players.txt
+# (None only sends the list to Discord)
+MEMBER_EXPORT_DIR = None
+
+# Optional: register the slash commands in these guilds only (instant updates)
+# instead of globally (None syncs globally)
+COMMAND_SYNC_GUILD_IDS = None
+
+# Optional: serve Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics
+# (None disables the endpoint)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None
@@ -2,319 +2,1288 @@ import sqlite3
 from datetime import datetime
 import os
 import logging
+import asyncio
+import contextvars
+import functools
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from afk_index import ActiveAfkIndex, AfkEntry
+from metrics import DATABASE_ERRORS, DATABASE_LATENCY
+from query_trace import QueryTracer, TracingConnection
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot_database.log'),
-        logging.StreamHandler()
-    ]
-)
+# Connection tuning
+READER_POOL_SIZE = 2
+WRITE_BATCH_MAX = 64
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16 * 1024
+MMAP_SIZE_BYTES = 64 * 1024 * 1024
+
+# Retention: entries moved per archive transaction, pages freed per incremental vacuum step
+ARCHIVE_BATCH_SIZE = 500
+VACUUM_STEP_PAGES = 1000
+
+def _migrate_epoch_timestamps(conn):
+    """Store start_date, end_date, created_at and ended_at as integer UTC epoch seconds"""
+    conn.execute('''
+        CREATE TABLE afk_users_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            display_name TEXT NOT NULL,
+            start_date INTEGER NOT NULL,
+            end_date INTEGER NOT NULL,
+            reason TEXT,
+            clan_role_id INTEGER NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+            ended_at INTEGER DEFAULT NULL,
+            is_active BOOLEAN DEFAULT 1
+        )
+    ''')
+
+    # start_date/end_date were written from datetime.now() (local time),
+    # created_at/ended_at from CURRENT_TIMESTAMP (already UTC)
+    conn.execute('''
+        INSERT INTO afk_users_new
+        (id, user_id, display_name, start_date, end_date, reason, clan_role_id, created_at, ended_at, is_active)
+        SELECT
+            id,
+            user_id,
+            display_name,
+            CAST(strftime('%s', start_date, 'utc') AS INTEGER),
+            CAST(strftime('%s', end_date, 'utc') AS INTEGER),
+            reason,
+            clan_role_id,
+            CAST(strftime('%s', COALESCE(created_at, 'now')) AS INTEGER),
+            CAST(strftime('%s', ended_at) AS INTEGER),
+            is_active
+        FROM afk_users
+    ''')
+
+    conn.execute("DROP TABLE afk_users")
+    conn.execute("ALTER TABLE afk_users_new RENAME TO afk_users")
+    conn.execute("CREATE INDEX idx_user_status ON afk_users(user_id, is_active)")
+
+def _migrate_query_indexes(conn):
+    """Replace the status indexes with partial and covering indexes for the hot queries"""
+    conn.execute("DROP INDEX IF EXISTS idx_user_status")
+
+    # Active entries are a small slice of the table, so the partial indexes stay small.
+    # is_active is repeated as the last column so SQLite treats them as covering.
+    conn.execute('''
+        CREATE INDEX idx_active_clan_start
+        ON afk_users(clan_role_id, start_date, end_date, user_id, display_name, reason, created_at, is_active)
+        WHERE is_active = 1
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_active_start
+        ON afk_users(start_date, end_date, user_id, display_name, reason, created_at, is_active)
+        WHERE is_active = 1
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_active_user_start
+        ON afk_users(user_id, start_date, end_date, display_name, reason, created_at, clan_role_id, is_active)
+        WHERE is_active = 1
+    ''')
+
+    # History is ordered by creation time per user
+    conn.execute("CREATE INDEX idx_user_created ON afk_users(user_id, created_at)")
+
+def _finished_duration_sql(row: str) -> str:
+    """
+    SQL for the seconds an inactive entry actually lasted, 0 if it never started
+
+    Entries that were ended early count up to ended_at, the rest up to end_date.
+    """
+    return f'''CASE
+        WHEN {row}.is_active = 0
+        AND MIN(COALESCE({row}.ended_at, {row}.end_date), {row}.end_date) > {row}.start_date
+        THEN MIN(COALESCE({row}.ended_at, {row}.end_date), {row}.end_date) - {row}.start_date
+        ELSE 0
+    END'''
+
+def _finished_count_sql(row: str) -> str:
+    """SQL that is 1 for an inactive entry with a positive duration, else 0"""
+    return f"(({_finished_duration_sql(row)}) > 0)"
+
+def _stats_add_sql() -> str:
+    """Trigger body that counts the NEW row into the per-clan statistics"""
+    return f'''
+        INSERT OR IGNORE INTO afk_clan_stats (clan_role_id) VALUES (NEW.clan_role_id);
+        INSERT OR IGNORE INTO afk_clan_user_counts (clan_role_id, user_id)
+        VALUES (NEW.clan_role_id, NEW.user_id);
+        UPDATE afk_clan_user_counts
+        SET entry_count = entry_count + 1
+        WHERE clan_role_id = NEW.clan_role_id AND user_id = NEW.user_id;
+        UPDATE afk_clan_stats SET
+            total_entries = total_entries + 1,
+            unique_users = unique_users + (
+                SELECT entry_count = 1 FROM afk_clan_user_counts
+                WHERE clan_role_id = NEW.clan_role_id AND user_id = NEW.user_id
+            ),
+            finished_entries = finished_entries + {_finished_count_sql("NEW")},
+            duration_sum = duration_sum + {_finished_duration_sql("NEW")}
+        WHERE clan_role_id = NEW.clan_role_id;
+    '''
+
+def _stats_remove_sql() -> str:
+    """Trigger body that takes the OLD row out of the per-clan statistics"""
+    return f'''
+        UPDATE afk_clan_user_counts
+        SET entry_count = entry_count - 1
+        WHERE clan_role_id = OLD.clan_role_id AND user_id = OLD.user_id;
+        UPDATE afk_clan_stats SET
+            total_entries = total_entries - 1,
+            unique_users = unique_users - (
+                SELECT entry_count = 0 FROM afk_clan_user_counts
+                WHERE clan_role_id = OLD.clan_role_id AND user_id = OLD.user_id
+            ),
+            finished_entries = finished_entries - {_finished_count_sql("OLD")},
+            duration_sum = duration_sum - {_finished_duration_sql("OLD")}
+        WHERE clan_role_id = OLD.clan_role_id;
+        DELETE FROM afk_clan_user_counts
+        WHERE clan_role_id = OLD.clan_role_id AND user_id = OLD.user_id AND entry_count = 0;
+    '''
+
+def _rebuild_clan_statistics(conn, tables=("afk_users",)):
+    """Recompute the per-clan aggregate tables from the entries in tables"""
+    entries = " UNION ALL ".join(
+        f"SELECT user_id, start_date, end_date, clan_role_id, ended_at, is_active FROM {table}"
+        for table in tables
+    )
+    conn.execute("DELETE FROM afk_clan_user_counts")
+    conn.execute("DELETE FROM afk_clan_stats")
+    conn.execute(f'''
+        INSERT INTO afk_clan_user_counts (clan_role_id, user_id, entry_count)
+        SELECT clan_role_id, user_id, COUNT(*)
+        FROM ({entries})
+        GROUP BY clan_role_id, user_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO afk_clan_stats
+        (clan_role_id, total_entries, unique_users, finished_entries, duration_sum)
+        SELECT
+            clan_role_id,
+            COUNT(*),
+            COUNT(DISTINCT user_id),
+            SUM({_finished_count_sql("entries")}),
+            SUM({_finished_duration_sql("entries")})
+        FROM ({entries}) AS entries
+        GROUP BY clan_role_id
+    ''')
+
+def _migrate_clan_statistics(conn):
+    """Maintain per-clan AFK totals, unique users and durations with triggers"""
+    conn.execute('''
+        CREATE TABLE afk_clan_stats (
+            clan_role_id INTEGER PRIMARY KEY,
+            total_entries INTEGER NOT NULL DEFAULT 0,
+            unique_users INTEGER NOT NULL DEFAULT 0,
+            finished_entries INTEGER NOT NULL DEFAULT 0,
+            duration_sum INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE afk_clan_user_counts (
+            clan_role_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            entry_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (clan_role_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER afk_stats_insert AFTER INSERT ON afk_users
+        BEGIN{_stats_add_sql()}END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER afk_stats_update AFTER UPDATE OF is_active, ended_at, start_date, end_date ON afk_users
+        BEGIN
+            UPDATE afk_clan_stats SET
+                finished_entries = finished_entries
+                    - {_finished_count_sql("OLD")} + {_finished_count_sql("NEW")},
+                duration_sum = duration_sum
+                    - {_finished_duration_sql("OLD")} + {_finished_duration_sql("NEW")}
+            WHERE clan_role_id = NEW.clan_role_id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER afk_stats_delete AFTER DELETE ON afk_users
+        BEGIN{_stats_remove_sql()}END
+    ''')
+
+    _rebuild_clan_statistics(conn)
+
+def _migrate_afk_archive(conn):
+    """Add afk_users_archive for ended entries moved out of afk_users by the retention job"""
+    conn.execute('''
+        CREATE TABLE afk_users_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            display_name TEXT NOT NULL,
+            start_date INTEGER NOT NULL,
+            end_date INTEGER NOT NULL,
+            reason TEXT,
+            clan_role_id INTEGER NOT NULL,
+            created_at INTEGER NOT NULL,
+            ended_at INTEGER DEFAULT NULL,
+            is_active BOOLEAN DEFAULT 0,
+            archived_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_archive_user_created ON afk_users_archive(user_id, created_at)")
+
+    # Archived entries stay in the statistics: moving a row adds it here before
+    # afk_stats_delete takes it out of afk_users, so the totals do not change
+    conn.execute(f'''
+        CREATE TRIGGER afk_archive_stats_insert AFTER INSERT ON afk_users_archive
+        BEGIN{_stats_add_sql()}END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER afk_archive_stats_delete AFTER DELETE ON afk_users_archive
+        BEGIN{_stats_remove_sql()}END
+    ''')
+
+def _migrate_drop_unused_indexes(conn):
+    """Drop the indexes no hot query uses and slim the partial indexes down to what the plans read"""
+    # Per-clan reads are served by the in-memory index and afk_clan_stats
+    conn.execute("DROP INDEX IF EXISTS idx_clan_status")
+    conn.execute("DROP INDEX IF EXISTS idx_active_clan_start")
+
+    # Neither query is answered from the index alone (active_afk_entries needs
+    # clan_role_id, the UPDATE writes the row), so the extra columns only cost writes
+    conn.execute("DROP INDEX IF EXISTS idx_active_start")
+    conn.execute("DROP INDEX IF EXISTS idx_active_user_start")
+    conn.execute("CREATE INDEX idx_active_start ON afk_users(start_date, end_date) WHERE is_active = 1")
+    conn.execute("CREATE INDEX idx_active_user ON afk_users(user_id) WHERE is_active = 1")
+
+# Schema migrations in order; MIGRATIONS[n] upgrades user_version n to n + 1
+MIGRATIONS = [
+    _migrate_epoch_timestamps,
+    _migrate_query_indexes,
+    _migrate_clan_statistics,
+    _migrate_afk_archive,
+    _migrate_drop_unused_indexes,
+]
+
+# Tables the per-clan statistics are computed from
+STATISTICS_TABLES = ("afk_users", "afk_users_archive")
+
+# Hot queries, shared with check_query_plans() so the checked SQL is the SQL that runs
+ACTIVE_AFK_ENTRIES_SQL = '''
+    SELECT 
+        id, 
+        user_id, 
+        display_name, 
+        start_date,
+        end_date, 
+        reason, 
+        created_at, 
+        clan_role_id
+    FROM afk_users 
+    WHERE is_active = 1 
+    AND end_date > ?
+    ORDER BY start_date ASC
+'''
+
+USER_AFK_HISTORY_SQL = '''
+    SELECT 
+        display_name, 
+        start_date,
+        end_date, 
+        reason, 
+        created_at, 
+        ended_at,
+        clan_role_id
+    FROM afk_users 
+    WHERE user_id = ? 
+    ORDER BY created_at DESC, id DESC 
+    LIMIT ?
+'''
+
+# Keyset pages of a user's history: a seek on idx_user_created(user_id, created_at, rowid)
+# past the (created_at, id) cursor, so every page costs the same however far back it is
+USER_AFK_HISTORY_COLUMNS = "display_name, start_date, end_date, reason, created_at, ended_at, clan_role_id, id"
+
+USER_AFK_HISTORY_OLDER_SQL = f'''
+    SELECT {USER_AFK_HISTORY_COLUMNS}
+    FROM afk_users
+    WHERE user_id = ? AND (created_at, id) < (?, ?)
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+
+USER_AFK_HISTORY_NEWER_SQL = f'''
+    SELECT {USER_AFK_HISTORY_COLUMNS}
+    FROM afk_users
+    WHERE user_id = ? AND (created_at, id) > (?, ?)
+    ORDER BY created_at ASC, id ASC
+    LIMIT ?
+'''
+
+# The same pages including archived entries: both tables are seeked the same way
+# and merged in key order, so archived history costs one more index seek
+def _with_archive_sql(comparison: str, order: str) -> str:
+    return "\n    UNION ALL".join(
+        f'''
+    SELECT {USER_AFK_HISTORY_COLUMNS}
+    FROM {table}
+    WHERE user_id = ? AND (created_at, id) {comparison} (?, ?)'''
+        for table in ("afk_users", "afk_users_archive")
+    ) + f'''
+    ORDER BY created_at {order}, id {order}
+    LIMIT ?
+'''
+
+USER_AFK_HISTORY_OLDER_ARCHIVED_SQL = _with_archive_sql("<", "DESC")
+USER_AFK_HISTORY_NEWER_ARCHIVED_SQL = _with_archive_sql(">", "ASC")
+
+DEACTIVATE_USER_AFK_SQL = '''
+    UPDATE afk_users 
+    SET is_active = 0, 
+        ended_at = ? 
+    WHERE user_id = ? 
+    AND is_active = 1
+'''
+
+HOT_QUERIES = {
+    "active_afk_entries": (ACTIVE_AFK_ENTRIES_SQL, (0,)),
+    "user_afk_history": (USER_AFK_HISTORY_SQL, (0, 5)),
+    "user_afk_history_older": (USER_AFK_HISTORY_OLDER_SQL, (0, 0, 0, 5)),
+    "user_afk_history_newer": (USER_AFK_HISTORY_NEWER_SQL, (0, 0, 0, 5)),
+    "user_afk_history_older_archived": (USER_AFK_HISTORY_OLDER_ARCHIVED_SQL, (0, 0, 0) * 2 + (5,)),
+    "user_afk_history_newer_archived": (USER_AFK_HISTORY_NEWER_ARCHIVED_SQL, (0, 0, 0) * 2 + (5,)),
+    "deactivate_user_afk": (DEACTIVATE_USER_AFK_SQL, (0, 0)),
+}
 
 class Database:
-    def __init__(self, db_file="bot_database.db"):
+    def __init__(self, db_file="bot_database.db", reader_count: int = READER_POOL_SIZE, write_batch_ms: float = None, trace_threshold_ms: float = None):
         self.db_file = db_file
+        self.reader_count = reader_count
         logging.info(f"Initializing database at: {os.path.abspath(db_file)}")
+
+        # Optional statement tracing, statements slower than the threshold get their query plan logged
+        self.tracer = QueryTracer(trace_threshold_ms) if trace_threshold_ms is not None else None
+
+        # One long-lived writer guarded by a lock plus a small pool of readers.
+        # WAL mode lets the readers keep working while the writer commits.
+        self._write_lock = threading.Lock()
+        self._writer_conn = self._connect()
+        self._readers = queue.Queue()
+        self._closed = False
+
+        # Current and future AFK entries, served from memory by the read commands
+        self.active_index = ActiveAfkIndex()
+
+        # Bumped after every committed write, lets callers cache what they render from the data
+        self.data_version = 0
+
         self.init_database()
 
+        for _ in range(reader_count):
+            self._readers.put(self._connect(read_only=True))
+
+        # Optional group commit: writes arriving within write_batch_ms share one transaction
+        self.write_queue = None
+        if write_batch_ms:
+            self.write_queue = WriteQueue(self._writer, write_batch_ms / 1000)
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Open a connection configured for WAL journaling and a warm page cache"""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=TracingConnection if self.tracer is not None else sqlite3.Connection
+        )
+        if self.tracer is not None:
+            conn.tracer = self.tracer
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    @contextmanager
+    def _writer(self):
+        """Yield the writer connection inside a transaction that commits on success"""
+        with self._write_lock:
+            with self._writer_conn:
+                yield self._writer_conn
+
+    @contextmanager
+    def _reader(self):
+        """Borrow a connection from the reader pool"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        """Close the writer and all pooled reader connections"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self.write_queue is not None:
+            self.write_queue.close()
+
+        with self._write_lock:
+            # Let SQLite refresh planner statistics for the indexes we actually used
+            self._writer_conn.execute("PRAGMA optimize")
+            self._writer_conn.close()
+
+        for _ in range(self.reader_count):
+            self._readers.get().close()
+
+        logging.info("Database connections closed")
+
     def init_database(self):
         """Initialize the database and create tables if they don't exist"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                
-                # Create AFK users table with start and end times
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS afk_users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        display_name TEXT NOT NULL,
-                        start_date TEXT NOT NULL,
-                        end_date TEXT NOT NULL,
-                        reason TEXT,
-                        clan_role_id INTEGER NOT NULL,
-                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                        ended_at TEXT DEFAULT NULL,
-                        is_active BOOLEAN DEFAULT 1
-                    )
-                ''')
-                
-                # Create indices for faster queries
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_user_status 
-                    ON afk_users(user_id, is_active)
-                ''')
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_clan_status 
-                    ON afk_users(clan_role_id, is_active)
-                ''')
-                
-                conn.commit()
-                logging.info("Database initialized successfully")
+            with self._writer() as conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+                # Base schema (version 0), upgraded by migrate() below
+                if version == 0:
+                    # Create AFK users table with start and end times
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS afk_users (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER NOT NULL,
+                            display_name TEXT NOT NULL,
+                            start_date TEXT NOT NULL,
+                            end_date TEXT NOT NULL,
+                            reason TEXT,
+                            clan_role_id INTEGER NOT NULL,
+                            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                            ended_at TEXT DEFAULT NULL,
+                            is_active BOOLEAN DEFAULT 1
+                        )
+                    ''')
+
+                    # Create indices for faster queries
+                    conn.execute('''
+                        CREATE INDEX IF NOT EXISTS idx_user_status 
+                        ON afk_users(user_id, is_active)
+                    ''')
+
+            self.migrate()
+            if self._writer_conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logging.info("Incremental vacuum is off, freed pages stay in the file until enable_incremental_vacuum() runs")
+            for name, detail in self.check_query_plans():
+                logging.warning(f"Query plan regression in {name}: {detail}")
+            self.load_active_index()
+            logging.info("Database initialized successfully")
 
         except sqlite3.Error as e:
             logging.error(f"SQLite error during initialization: {e}")
             raise
 
-    def set_afk(self, user_id: int, display_name: str, start_date: datetime, end_date: datetime, reason: str, clan_role_id: int):
-        """Set a user as AFK"""
-        self.deactivate_previous_afk(user_id)
-        
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO afk_users 
-                (user_id, display_name, start_date, end_date, reason, clan_role_id, is_active)
-                VALUES (?, ?, ?, ?, ?, ?, 1)
-            ''', (
-                user_id, 
-                display_name, 
-                start_date.strftime("%Y-%m-%d %H:%M:%S"),
-                end_date.strftime("%Y-%m-%d %H:%M:%S"),
-                reason,
-                clan_role_id
-            ))
-            conn.commit()
+    def migrate(self):
+        """Apply pending schema migrations, tracked through PRAGMA user_version"""
+        version = self._writer_conn.execute("PRAGMA user_version").fetchone()[0]
+
+        for target_version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logging.info(f"Migrating database to schema version {target_version}: {migration.__doc__}")
+            with self._writer() as conn:
+                # DDL does not open a transaction implicitly, so start one to keep each step atomic
+                conn.execute("BEGIN")
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+
+    def check_query_plans(self):
+        """
+        Run EXPLAIN QUERY PLAN over the hot queries
+
+        Returns:
+            List of (query name, plan detail) for every step that scans the
+            table without an index or sorts through a temporary B-tree
+        """
+        problems = []
+        for name, (sql, params) in HOT_QUERIES.items():
+            for row in self._writer_conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+                detail = row[-1]
+                full_scan = detail.startswith("SCAN") and "INDEX" not in detail
+                if full_scan or "TEMP B-TREE" in detail:
+                    problems.append((name, detail))
+        return problems
+
+    def load_active_index(self):
+        """Rebuild the in-memory index from the active rows in the database"""
+        with self._write_lock:
+            rows = self._writer_conn.execute(ACTIVE_AFK_ENTRIES_SQL, (int(time.time()),)).fetchall()
+            self.active_index.load(AfkEntry(*row) for row in rows)
+            self.data_version += 1
+        logging.info(f"Loaded {len(self.active_index)} active AFK entries into memory")
+
+    def _write(self, func, *args, on_commit=None):
+        """
+        Run a write transaction, through the write queue when group commit is enabled
+
+        on_commit is called with the transaction result once it has committed,
+        in commit order, so in-memory state follows the database exactly.
+        data_version is bumped after on_commit has run.
+        """
+        def committed(result):
+            if on_commit is not None:
+                on_commit(result)
+            self.data_version += 1
+
+        if self.write_queue is not None:
+            return self.write_queue.submit(func, *args, on_commit=committed).result()
+
+        with self._write_lock:
+            with self._writer_conn as conn:
+                result = func(conn, *args)
+            committed(result)
+            return result
+
+    def set_afk(self, user_id: int, display_name: str, start_date: datetime, end_date: datetime, reason: str, clan_role_id: int) -> int:
+        """Set a user as AFK, replacing any active entry in the same transaction"""
+        entry = AfkEntry(
+            id=None,
+            user_id=user_id,
+            display_name=display_name,
+            start_date=int(start_date.timestamp()),
+            end_date=int(end_date.timestamp()),
+            reason=reason,
+            created_at=int(time.time()),
+            clan_role_id=clan_role_id
+        )
+
+        def on_commit(entry_id):
+            self.active_index.remove_user(user_id)
+            self.active_index.add(entry._replace(id=entry_id))
+
+        return self._write(self._set_afk_tx, entry, on_commit=on_commit)
+
+    def _set_afk_tx(self, conn, entry: AfkEntry) -> int:
+        self._deactivate_previous_afk_tx(conn, entry.user_id)
+
+        cursor = conn.execute('''
+            INSERT INTO afk_users 
+            (user_id, display_name, start_date, end_date, reason, clan_role_id, created_at, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ''', (
+            entry.user_id, 
+            entry.display_name, 
+            entry.start_date,
+            entry.end_date,
+            entry.reason,
+            entry.clan_role_id,
+            entry.created_at
+        ))
+        return cursor.lastrowid
 
     def deactivate_previous_afk(self, user_id: int):
         """Deactivate any active AFK status for a user"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE afk_users 
-                SET is_active = 0, 
-                    ended_at = CURRENT_TIMESTAMP 
-                WHERE user_id = ? 
-                AND is_active = 1
-            ''', (user_id,))
-            conn.commit()
+        return self._write(
+            self._deactivate_previous_afk_tx, user_id,
+            on_commit=lambda _: self.active_index.remove_user(user_id)
+        )
+
+    def _deactivate_previous_afk_tx(self, conn, user_id) -> int:
+        cursor = conn.execute(DEACTIVATE_USER_AFK_SQL, (int(time.time()), user_id))
+        return cursor.rowcount
 
     def remove_afk(self, user_id: int) -> bool:
         """Mark AFK status as inactive for a user"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE afk_users 
-                SET is_active = 0, 
-                    ended_at = CURRENT_TIMESTAMP 
-                WHERE user_id = ? 
-                AND is_active = 1
-            ''', (user_id,))
-            conn.commit()
-            return cursor.rowcount > 0
+        return self.deactivate_previous_afk(user_id) > 0
+
+    def expire_finished_afk(self, now: int = None) -> int:
+        """Mark every active entry whose end_date has passed as inactive, returning the count"""
+        if now is None:
+            now = int(time.time())
+
+        expired_count = self._write(
+            self._expire_finished_afk_tx, now,
+            on_commit=lambda _: self.active_index.remove_ended(now)
+        )
+        if expired_count:
+            logging.info(f"Expired {expired_count} finished AFK entries")
+        return expired_count
+
+    def _expire_finished_afk_tx(self, conn, now) -> int:
+        # ended_at stays NULL: the entry ran its full course rather than ending early
+        cursor = conn.execute('''
+            UPDATE afk_users 
+            SET is_active = 0 
+            WHERE is_active = 1 
+            AND end_date <= ?
+        ''', (now,))
+        return cursor.rowcount
 
     def get_all_active_afk(self, clan_role_id: int = None):
         """Get all active AFK users, optionally filtered by clan"""
-        current_time = datetime.now()
-        
+        current_time = int(time.time())
+
+        return [
+            (entry.user_id, entry.display_name, entry.start_date, entry.end_date, entry.reason, entry.created_at)
+            for entry in self.active_index.current_and_future(current_time, clan_role_id)
+        ]
+
+    def get_active_afk_for_clans(self, clan_role_ids):
+        """
+        Get the active AFK users of several clans at once
+
+        Returns:
+            Dict mapping each clan role ID to its rows, in the same shape as
+            get_all_active_afk
+        """
+        current_time = int(time.time())
+
+        grouped = self.active_index.current_and_future_by_clan(current_time, clan_role_ids)
+        return {
+            clan_role_id: [
+                (entry.user_id, entry.display_name, entry.start_date, entry.end_date, entry.reason, entry.created_at)
+                for entry in entries
+            ]
+            for clan_role_id, entries in grouped.items()
+        }
+
+    def get_user_afk_history(self, user_id: int, limit: int = 5):
+        """Get AFK history for a specific user"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                if clan_role_id is not None:
-                    cursor.execute('''
-                        SELECT 
-                            user_id, 
-                            display_name, 
-                            start_date,
-                            end_date, 
-                            reason, 
-                            created_at 
-                        FROM afk_users 
-                        WHERE is_active = 1 
-                        AND clan_role_id = ?
-                        AND (
-                            (start_date <= ? AND end_date > ?) 
-                            OR start_date > ?
-                        )
-                        ORDER BY start_date ASC
-                    ''', (
-                        clan_role_id,
-                        current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        current_time.strftime("%Y-%m-%d %H:%M:%S")
-                    ))
-                else:
-                    cursor.execute('''
-                        SELECT 
-                            user_id, 
-                            display_name, 
-                            start_date,
-                            end_date, 
-                            reason, 
-                            created_at 
-                        FROM afk_users 
-                        WHERE is_active = 1 
-                        AND (
-                            (start_date <= ? AND end_date > ?) 
-                            OR start_date > ?
-                        )
-                        ORDER BY start_date ASC
-                    ''', (
-                        current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        current_time.strftime("%Y-%m-%d %H:%M:%S")
-                    ))
+            with self._reader() as conn:
+                cursor = conn.execute(USER_AFK_HISTORY_SQL, (user_id, limit))
                 return cursor.fetchall()
         except sqlite3.Error as e:
-            logging.error(f"Error getting active AFK users: {e}")
+            logging.error(f"Error getting user AFK history: {e}")
             raise
 
-    def get_user_afk_history(self, user_id: int, limit: int = 5):
-        """Get AFK history for a specific user"""
+    def get_user_afk_history_page(self, user_id: int, limit: int = 5, before: tuple = None, after: tuple = None, include_archived: bool = False):
+        """
+        Get one page of a user's AFK history, newest first
+
+        Args:
+            user_id: The Discord user ID
+            limit: Entries per page
+            before: Cursor from a previous page, returns the entries older than it
+            after: Cursor from a previous page, returns the entries newer than it
+            include_archived: Also page through entries moved to afk_users_archive
+
+        Returns:
+            (rows, older, newer): rows in the get_user_afk_history shape, and
+            the cursors for the pages older and newer than this one (None at
+            either end of the history)
+        """
+        # One extra row tells whether there is another page in the direction we are paging
+        if after is not None:
+            sql, cursor = USER_AFK_HISTORY_NEWER_SQL, after
+        else:
+            # The first page starts past the newest possible key
+            sql, cursor = USER_AFK_HISTORY_OLDER_SQL, before or (2**63 - 1, 2**63 - 1)
+
+        params = (user_id, cursor[0], cursor[1], limit + 1)
+        if include_archived:
+            sql = USER_AFK_HISTORY_NEWER_ARCHIVED_SQL if after is not None else USER_AFK_HISTORY_OLDER_ARCHIVED_SQL
+            params = params[:3] * 2 + params[3:]
+
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT 
-                        display_name, 
-                        start_date,
-                        end_date, 
-                        reason, 
-                        created_at, 
-                        ended_at,
-                        clan_role_id
-                    FROM afk_users 
-                    WHERE user_id = ? 
-                    ORDER BY created_at DESC 
-                    LIMIT ?
-                ''', (user_id, limit))
-                return cursor.fetchall()
+            with self._reader() as conn:
+                rows = conn.execute(sql, params).fetchall()
         except sqlite3.Error as e:
             logging.error(f"Error getting user AFK history: {e}")
             raise
 
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if after is not None:
+            rows.reverse()
+            has_newer, has_older = more, True
+        else:
+            has_older, has_newer = more, before is not None
+
+        if not rows:
+            return [], None, None
+
+        # Cursor keys are (created_at, id), the last two selected columns
+        older = (rows[-1][4], rows[-1][7]) if has_older else None
+        newer = (rows[0][4], rows[0][7]) if has_newer else None
+        return [row[:7] for row in rows], older, newer
+
     def get_afk_statistics(self, clan_role_id: int = None):
-        """Get AFK statistics for a specific clan"""
-        current_time = datetime.now()
-        
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            
+        """
+        Get AFK statistics for a specific clan
+
+        Totals and durations come from the trigger-maintained afk_clan_stats
+        table, current and scheduled counts from the in-memory index.
+
+        Returns:
+            (total_afk, unique_users, active_now, scheduled_future, avg_duration_days)
+        """
+        current_time = int(time.time())
+
+        with self._reader() as conn:
             if clan_role_id is not None:
-                cursor.execute('''
-                    SELECT 
-                        COUNT(*) as total_afk,
-                        COUNT(DISTINCT user_id) as unique_users,
-                        COUNT(CASE 
-                            WHEN is_active = 1 
-                            AND start_date <= ? 
-                            AND end_date > ? 
-                            THEN 1 
-                        END) as active_now,
-                        COUNT(CASE 
-                            WHEN is_active = 1 
-                            AND start_date > ? 
-                            THEN 1 
-                        END) as scheduled_future,
-                        AVG(CASE 
-                            WHEN ended_at IS NOT NULL 
-                            THEN julianday(COALESCE(ended_at, end_date)) - julianday(start_date)
-                            WHEN end_date < ?
-                            THEN julianday(end_date) - julianday(start_date)
-                        END) as avg_duration_days
-                    FROM afk_users
+                row = conn.execute('''
+                    SELECT total_entries, unique_users, finished_entries, duration_sum
+                    FROM afk_clan_stats
                     WHERE clan_role_id = ?
-                ''', (
-                    current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    clan_role_id
-                ))
+                ''', (clan_role_id,)).fetchone()
             else:
-                cursor.execute('''
-                    SELECT 
-                        COUNT(*) as total_afk,
-                        COUNT(DISTINCT user_id) as unique_users,
-                        COUNT(CASE 
-                            WHEN is_active = 1 
-                            AND start_date <= ? 
-                            AND end_date > ? 
-                            THEN 1 
-                        END) as active_now,
-                        COUNT(CASE 
-                            WHEN is_active = 1 
-                            AND start_date > ? 
-                            THEN 1 
-                        END) as scheduled_future,
-                        AVG(CASE 
-                            WHEN ended_at IS NOT NULL 
-                            THEN julianday(COALESCE(ended_at, end_date)) - julianday(start_date)
-                            WHEN end_date < ?
-                            THEN julianday(end_date) - julianday(start_date)
-                        END) as avg_duration_days
-                    FROM afk_users
-                ''', (
-                    current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    current_time.strftime("%Y-%m-%d %H:%M:%S")
-                ))
-            
-            return cursor.fetchone()
+                row = conn.execute('''
+                    SELECT
+                        SUM(total_entries),
+                        (SELECT COUNT(DISTINCT user_id) FROM afk_clan_user_counts),
+                        SUM(finished_entries),
+                        SUM(duration_sum)
+                    FROM afk_clan_stats
+                ''').fetchone()
+
+        total_afk, unique_users, finished_entries, duration_sum = row or (0, 0, 0, 0)
+        avg_duration_days = duration_sum / finished_entries / 86400 if finished_entries else None
+
+        return (
+            total_afk or 0,
+            unique_users or 0,
+            len(self.active_index.active_at(current_time, clan_role_id)),
+            len(self.active_index.scheduled_after(current_time, clan_role_id)),
+            avg_duration_days
+        )
+
+    def get_afk_statistics_for_clans(self, clan_role_ids):
+        """
+        Get AFK statistics for several clans with a single query
+
+        Returns:
+            Dict mapping each clan role ID to the same tuple as get_afk_statistics
+        """
+        current_time = int(time.time())
+        clan_role_ids = list(clan_role_ids)
+
+        with self._reader() as conn:
+            placeholders = ", ".join("?" * len(clan_role_ids))
+            rows = {
+                row[0]: row[1:]
+                for row in conn.execute(f'''
+                    SELECT clan_role_id, total_entries, unique_users, finished_entries, duration_sum
+                    FROM afk_clan_stats
+                    WHERE clan_role_id IN ({placeholders})
+                ''', clan_role_ids)
+            }
+
+        statistics = {}
+        for clan_role_id in clan_role_ids:
+            total_afk, unique_users, finished_entries, duration_sum = rows.get(clan_role_id, (0, 0, 0, 0))
+            statistics[clan_role_id] = (
+                total_afk,
+                unique_users,
+                len(self.active_index.active_at(current_time, clan_role_id)),
+                len(self.active_index.scheduled_after(current_time, clan_role_id)),
+                duration_sum / finished_entries / 86400 if finished_entries else None
+            )
+        return statistics
+
+    def rebuild_statistics(self):
+        """
+        Recompute the per-clan statistics from scratch and compare them with the cached values
+
+        Archived entries are counted like live ones.
+
+        Returns:
+            List of (clan_role_id, column, cached value, recomputed value) for
+            every value that did not match; the cache is replaced either way
+        """
+        columns = ("total_entries", "unique_users", "finished_entries", "duration_sum")
+
+        def rebuild(conn):
+            query = f"SELECT clan_role_id, {', '.join(columns)} FROM afk_clan_stats"
+            cached = {row[0]: row[1:] for row in conn.execute(query)}
+            _rebuild_clan_statistics(conn, STATISTICS_TABLES)
+            rebuilt = {row[0]: row[1:] for row in conn.execute(query)}
+
+            mismatches = []
+            for clan_role_id in sorted(cached.keys() | rebuilt.keys()):
+                old = cached.get(clan_role_id, (0,) * len(columns))
+                new = rebuilt.get(clan_role_id, (0,) * len(columns))
+                for column, old_value, new_value in zip(columns, old, new):
+                    if old_value != new_value:
+                        mismatches.append((clan_role_id, column, old_value, new_value))
+            return mismatches
+
+        mismatches = self._write(rebuild)
+        for clan_role_id, column, old_value, new_value in mismatches:
+            logging.warning(f"AFK statistics mismatch for clan {clan_role_id}: {column} was {old_value}, recomputed {new_value}")
+        logging.info(f"Rebuilt AFK statistics ({len(mismatches)} mismatches)")
+        return mismatches
 
     def delete_afk_entries(self, user_id: int, all_entries: bool = False) -> int:
         """
         Delete AFK entries for a specific user
-        
+
         Args:
             user_id: The Discord user ID
             all_entries: If True, deletes all entries, if False only deletes active entries
-        
+
         Returns:
             Number of deleted entries
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                
-                if all_entries:
-                    # Delete all entries for the user
-                    cursor.execute('''
-                        DELETE FROM afk_users 
-                        WHERE user_id = ?
-                    ''', (user_id,))
-                else:
-                    # Delete only active entries
-                    cursor.execute('''
-                        DELETE FROM afk_users 
-                        WHERE user_id = ? AND is_active = 1
-                    ''', (user_id,))
-                
-                deleted_count = cursor.rowcount
-                conn.commit()
-                
-                logging.info(f"Deleted {deleted_count} AFK entries for user {user_id}")
-                return deleted_count
+            # Both modes remove every active entry of the user
+            deleted_count = self._write(
+                self._delete_afk_entries_tx, user_id, all_entries,
+                on_commit=lambda _: self.active_index.remove_user(user_id)
+            )
+
+            logging.info(f"Deleted {deleted_count} AFK entries for user {user_id}")
+            return deleted_count
 
         except sqlite3.Error as e:
             logging.error(f"Error deleting AFK entries: {e}")
-            raise 
+            raise
+
+    def _delete_afk_entries_tx(self, conn, user_id, all_entries) -> int:
+        if all_entries:
+            # Delete all entries for the user, archived ones included
+            archived = conn.execute('''
+                DELETE FROM afk_users_archive
+                WHERE user_id = ?
+            ''', (user_id,)).rowcount
+            cursor = conn.execute('''
+                DELETE FROM afk_users 
+                WHERE user_id = ?
+            ''', (user_id,))
+            return archived + cursor.rowcount
+        else:
+            # Delete only active entries
+            cursor = conn.execute('''
+                DELETE FROM afk_users 
+                WHERE user_id = ? AND is_active = 1
+            ''', (user_id,))
+        return cursor.rowcount
+
+    def import_afk(self, entries) -> list:
+        """
+        Insert many AFK entries in one transaction
+
+        Unlike set_afk, existing active entries of the users are kept, so a
+        schedule with several entries per user can be loaded at once.
+
+        Args:
+            entries: AfkEntry tuples, their id is ignored
+
+        Returns:
+            The ids of the inserted entries, in order
+        """
+        entries = list(entries)
+
+        def on_commit(entry_ids):
+            for entry, entry_id in zip(entries, entry_ids):
+                self.active_index.add(entry._replace(id=entry_id))
+
+        entry_ids = self._write(self._import_afk_tx, entries, on_commit=on_commit)
+        logging.info(f"Imported {len(entry_ids)} AFK entries")
+        return entry_ids
+
+    def _import_afk_tx(self, conn, entries) -> list:
+        if not entries:
+            return []
+
+        # executemany does not report row ids, but AUTOINCREMENT hands out
+        # consecutive ones while this transaction holds the write lock
+        sequence_sql = "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'afk_users'"
+        first_id = conn.execute(sequence_sql).fetchone()[0] + 1
+        conn.executemany('''
+            INSERT INTO afk_users 
+            (user_id, display_name, start_date, end_date, reason, clan_role_id, created_at, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ''', [
+            (entry.user_id, entry.display_name, entry.start_date, entry.end_date, entry.reason, entry.clan_role_id, entry.created_at)
+            for entry in entries
+        ])
+        last_id = conn.execute(sequence_sql).fetchone()[0]
+        if last_id - first_id + 1 != len(entries):
+            raise sqlite3.DatabaseError("AFK import did not receive consecutive ids")
+        return list(range(first_id, last_id + 1))
+
+    @staticmethod
+    def _range_filter(start_date: datetime, end_date: datetime, clan_role_id: int = None):
+        """WHERE clause and parameters for entries overlapping [start_date, end_date), optionally of one clan"""
+        where = "start_date < ? AND end_date > ?"
+        params = [int(end_date.timestamp()), int(start_date.timestamp())]
+        if clan_role_id is not None:
+            where = f"clan_role_id = ? AND {where}"
+            params.insert(0, clan_role_id)
+        return where, params
+
+    def delete_afk_range(self, start_date: datetime, end_date: datetime, clan_role_id: int = None) -> int:
+        """
+        Delete every AFK entry overlapping a date range, archived ones included
+
+        Args:
+            start_date: Start of the range
+            end_date: End of the range (exclusive)
+            clan_role_id: Only delete entries of this clan; None for all clans
+
+        Returns:
+            Number of deleted entries
+        """
+        where, params = self._range_filter(start_date, end_date, clan_role_id)
+        entry_ids = self._write(
+            self._delete_afk_range_tx, where, params,
+            on_commit=lambda entry_ids: [self.active_index.remove(entry_id) for entry_id in entry_ids]
+        )
+        logging.info(f"Deleted {len(entry_ids)} AFK entries between {start_date} and {end_date}")
+        return len(entry_ids)
+
+    def _delete_afk_range_tx(self, conn, where, params) -> list:
+        # Archived entries go too, like with delete_afk_entries(all_entries=True);
+        # only live ids can be in the active index
+        archived_ids = [row[0] for row in conn.execute(f"SELECT id FROM afk_users_archive WHERE {where}", params)]
+        conn.execute(f"DELETE FROM afk_users_archive WHERE {where}", params)
+        entry_ids = [row[0] for row in conn.execute(f"SELECT id FROM afk_users WHERE {where}", params)]
+        conn.execute(f"DELETE FROM afk_users WHERE {where}", params)
+        return entry_ids + archived_ids
+
+    def end_afk_range(self, start_date: datetime, end_date: datetime, clan_role_id: int = None) -> int:
+        """
+        End every active AFK entry overlapping a date range now, like /unafk does
+
+        Args:
+            start_date: Start of the range
+            end_date: End of the range (exclusive)
+            clan_role_id: Only end entries of this clan; None for all clans
+
+        Returns:
+            Number of ended entries
+        """
+        where, params = self._range_filter(start_date, end_date, clan_role_id)
+        entry_ids = self._write(
+            self._end_afk_range_tx, f"is_active = 1 AND {where}", params, int(time.time()),
+            on_commit=lambda entry_ids: [self.active_index.remove(entry_id) for entry_id in entry_ids]
+        )
+        logging.info(f"Ended {len(entry_ids)} AFK entries between {start_date} and {end_date}")
+        return len(entry_ids)
+
+    def _end_afk_range_tx(self, conn, where, params, now) -> list:
+        entry_ids = [row[0] for row in conn.execute(f"SELECT id FROM afk_users WHERE {where}", params)]
+        conn.execute(f"UPDATE afk_users SET is_active = 0, ended_at = ? WHERE {where}", [now, *params])
+        return entry_ids
+
+    def archive_finished_afk(self, ended_before: int, batch_size: int = ARCHIVE_BATCH_SIZE, after_id: int = 0) -> list:
+        """
+        Move up to batch_size inactive entries that ended before ended_before to afk_users_archive
+
+        Each call is one short write transaction; call it again with after_id
+        set to the last returned id until it returns less than batch_size to
+        archive everything that is due. Every batch then resumes its primary
+        key walk where the previous one stopped instead of rescanning the
+        rows it already skipped. The statistics are unchanged, see
+        _migrate_afk_archive.
+
+        Returns:
+            Ids of the archived entries, ascending
+        """
+        return self._write(self._archive_finished_afk_tx, ended_before, batch_size, after_id, int(time.time()))
+
+    def _archive_finished_afk_tx(self, conn, ended_before, batch_size, after_id, archived_at) -> list:
+        # Old entries have the lowest ids, so walking the primary key finds them first
+        ids = [row[0] for row in conn.execute('''
+            SELECT id FROM afk_users
+            WHERE id > ?
+            AND is_active = 0
+            AND COALESCE(ended_at, end_date) < ?
+            ORDER BY id
+            LIMIT ?
+        ''', (after_id, ended_before, batch_size))]
+        if not ids:
+            return ids
+
+        placeholders = ", ".join("?" * len(ids))
+        conn.execute(f'''
+            INSERT INTO afk_users_archive
+            (id, user_id, display_name, start_date, end_date, reason, clan_role_id, created_at, ended_at, is_active, archived_at)
+            SELECT id, user_id, display_name, start_date, end_date, reason, clan_role_id, created_at, ended_at, is_active, ?
+            FROM afk_users
+            WHERE id IN ({placeholders})
+        ''', [archived_at, *ids])
+        conn.execute(f"DELETE FROM afk_users WHERE id IN ({placeholders})", ids)
+        return ids
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Switch the database to auto_vacuum = INCREMENTAL, rebuilding the file once if needed
+
+        The switch only takes effect through a full VACUUM, which rewrites
+        the whole file and holds the write lock until it is done, so this is
+        a maintenance step an admin runs once (/dbcompact), not part of
+        startup. Until then incremental_vacuum() frees nothing.
+
+        Returns:
+            True if the file was rebuilt, False if incremental vacuum was already on
+        """
+        with self._write_lock:
+            if self._writer_conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+            logging.info("Enabling incremental vacuum, rebuilding the database file")
+            started = time.perf_counter()
+            self._writer_conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # VACUUM cannot run inside a transaction
+            self._writer_conn.execute("VACUUM")
+            logging.info(f"Database file rebuilt in {time.perf_counter() - started:.1f}s")
+            return True
+
+    def incremental_vacuum(self, max_pages: int = VACUUM_STEP_PAGES) -> int:
+        """
+        Return up to max_pages free pages to the file system
+
+        Returns:
+            Number of pages freed, 0 once the free list is empty
+        """
+        with self._write_lock:
+            conn = self._writer_conn
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free_before:
+                return 0
+            # execute() would only step the pragma once, freeing a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            freed = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if freed:
+                # The file only shrinks once the WAL is checkpointed into it
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return freed
 
     def get_user_active_afk(self, user_id: int):
         """Get current and future AFK entries for a user"""
-        current_time = datetime.now()
-        
+        current_time = int(time.time())
+
+        return [
+            (entry.display_name, entry.start_date, entry.end_date, entry.reason, entry.created_at, entry.clan_role_id)
+            for entry in self.active_index.for_user(user_id, current_time)
+        ]
+
+    def query_stats(self, limit: int = 10):
+        """
+        The traced statements with the most total time
+
+        Returns:
+            List of StatementStats, empty when tracing is disabled
+        """
+        if self.tracer is None:
+            return []
+        return self.tracer.top(limit)
+
+    def reset_query_stats(self):
+        """Clear the collected statement statistics"""
+        if self.tracer is not None:
+            self.tracer.reset()
+
+class WriteQueue:
+    """Write-behind queue that group-commits writes arriving within a short window"""
+
+    def __init__(self, writer, batch_window: float, max_batch: int = WRITE_BATCH_MAX):
+        self._writer = writer
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="database-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, on_commit=None) -> Future:
+        """Queue a transaction body func(conn, *args) and return a future for its result"""
+        future = Future()
+        self._queue.put((func, args, on_commit, future))
+        return future
+
+    def close(self):
+        """Flush pending writes and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            # Collect everything that arrives within the batch window
+            batch = [job]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+
+            self._commit(batch)
+
+        # Drain anything queued after the stop request
+        pending = []
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if job is not None:
+                pending.append(job)
+        if pending:
+            self._commit(pending)
+
+    def _commit(self, batch):
+        """Run a batch in one transaction; each job gets its own savepoint"""
+        results = []
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT 
-                        display_name, 
-                        start_date,
-                        end_date, 
-                        reason,
-                        created_at,
-                        clan_role_id
-                    FROM afk_users 
-                    WHERE user_id = ? 
-                    AND is_active = 1
-                    AND end_date >= ?
-                    ORDER BY start_date ASC
-                ''', (user_id, current_time.strftime("%Y-%m-%d %H:%M:%S")))
-                return cursor.fetchall()
-        except sqlite3.Error as e:
-            logging.error(f"Error getting user active AFK entries: {e}")
-            raise
\ No newline at end of file
+            with self._writer() as conn:
+                conn.execute("BEGIN")
+                for func, args, on_commit, future in batch:
+                    conn.execute("SAVEPOINT write_job")
+                    try:
+                        results.append((future, func(conn, *args), None))
+                        conn.execute("RELEASE write_job")
+                    except Exception as e:
+                        # Only this job is undone; the rest of the batch still commits
+                        conn.execute("ROLLBACK TO write_job")
+                        conn.execute("RELEASE write_job")
+                        results.append((future, None, e))
+        except Exception as e:
+            logging.error(f"Error committing batch of {len(batch)} writes: {e}")
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        # Batches are committed one at a time on this thread, so callbacks run in commit order
+        for (_, _, on_commit, _), (future, result, error) in zip(batch, results):
+            if error is not None:
+                future.set_exception(error)
+                continue
+            try:
+                if on_commit is not None:
+                    on_commit(result)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+class AsyncDatabase:
+    """Awaitable facade over Database that runs every call on a worker thread"""
+
+    def __init__(self, db: Database, max_workers: int = None):
+        self.db = db
+        # One worker per pooled reader plus one for the writer, all off the event loop
+        if max_workers is None:
+            max_workers = db.reader_count + 1
+            if db.write_queue is not None:
+                # Writers only block on the queue, so let enough of them wait to fill a batch
+                max_workers += db.write_queue.max_batch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="database")
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking Database call in the executor and await its result"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Run in a copy of the caller's context so log records keep the command name
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        try:
+            return await loop.run_in_executor(self._executor, call)
+        except Exception:
+            DATABASE_ERRORS.labels(method=func.__name__).inc()
+            raise
+        finally:
+            DATABASE_LATENCY.labels(method=func.__name__).observe(time.perf_counter() - started)
+
+    async def set_afk(self, user_id: int, display_name: str, start_date: datetime, end_date: datetime, reason: str, clan_role_id: int):
+        """Set a user as AFK"""
+        return await self._run(self.db.set_afk, user_id, display_name, start_date, end_date, reason, clan_role_id)
+
+    async def deactivate_previous_afk(self, user_id: int):
+        """Deactivate any active AFK status for a user"""
+        return await self._run(self.db.deactivate_previous_afk, user_id)
+
+    async def remove_afk(self, user_id: int) -> bool:
+        """Mark AFK status as inactive for a user"""
+        return await self._run(self.db.remove_afk, user_id)
+
+    async def expire_finished_afk(self, now: int = None) -> int:
+        """Mark every active entry whose end_date has passed as inactive"""
+        return await self._run(self.db.expire_finished_afk, now)
+
+    async def get_all_active_afk(self, clan_role_id: int = None):
+        """Get all active AFK users, optionally filtered by clan"""
+        return await self._run(self.db.get_all_active_afk, clan_role_id)
+
+    async def get_active_afk_for_clans(self, clan_role_ids):
+        """Get the active AFK users of several clans at once"""
+        return await self._run(self.db.get_active_afk_for_clans, clan_role_ids)
+
+    async def get_user_afk_history(self, user_id: int, limit: int = 5):
+        """Get AFK history for a specific user"""
+        return await self._run(self.db.get_user_afk_history, user_id, limit)
+
+    async def get_user_afk_history_page(self, user_id: int, limit: int = 5, before: tuple = None, after: tuple = None, include_archived: bool = False):
+        """Get one page of a user's AFK history and the cursors of its neighbours"""
+        return await self._run(self.db.get_user_afk_history_page, user_id, limit, before, after, include_archived)
+
+    async def get_afk_statistics(self, clan_role_id: int = None):
+        """Get AFK statistics for a specific clan"""
+        return await self._run(self.db.get_afk_statistics, clan_role_id)
+
+    async def get_afk_statistics_for_clans(self, clan_role_ids):
+        """Get AFK statistics for several clans with a single query"""
+        return await self._run(self.db.get_afk_statistics_for_clans, clan_role_ids)
+
+    async def rebuild_statistics(self):
+        """Recompute the per-clan statistics and return the mismatches"""
+        return await self._run(self.db.rebuild_statistics)
+
+    async def delete_afk_entries(self, user_id: int, all_entries: bool = False) -> int:
+        """Delete AFK entries for a specific user"""
+        return await self._run(self.db.delete_afk_entries, user_id, all_entries)
+
+    async def import_afk(self, entries) -> list:
+        """Insert many AFK entries in one transaction"""
+        return await self._run(self.db.import_afk, entries)
+
+    async def delete_afk_range(self, start_date: datetime, end_date: datetime, clan_role_id: int = None) -> int:
+        """Delete every AFK entry overlapping a date range"""
+        return await self._run(self.db.delete_afk_range, start_date, end_date, clan_role_id)
+
+    async def end_afk_range(self, start_date: datetime, end_date: datetime, clan_role_id: int = None) -> int:
+        """End every active AFK entry overlapping a date range"""
+        return await self._run(self.db.end_afk_range, start_date, end_date, clan_role_id)
+
+    async def archive_finished_afk(self, ended_before: int, batch_size: int = ARCHIVE_BATCH_SIZE, after_id: int = 0) -> list:
+        """Move one batch of entries that ended before ended_before and have ids above after_id to the archive"""
+        return await self._run(self.db.archive_finished_afk, ended_before, batch_size, after_id)
+
+    async def enable_incremental_vacuum(self) -> bool:
+        """Switch to incremental vacuum, rebuilding the database file once"""
+        return await self._run(self.db.enable_incremental_vacuum)
+
+    async def incremental_vacuum(self, max_pages: int = VACUUM_STEP_PAGES) -> int:
+        """Return up to max_pages free pages to the file system"""
+        return await self._run(self.db.incremental_vacuum, max_pages)
+
+    async def get_user_active_afk(self, user_id: int):
+        """Get current and future AFK entries for a user"""
+        return await self._run(self.db.get_user_active_afk, user_id)
+
+    @property
+    def data_version(self) -> int:
+        """Counter bumped after every committed write"""
+        return self.db.data_version
+
+    async def query_stats(self, limit: int = 10):
+        """The traced statements with the most total time"""
+        return self.db.query_stats(limit)
+
+    async def reset_query_stats(self):
+        """Clear the collected statement statistics"""
+        self.db.reset_query_stats()
+
+    def close(self):
+        """Wait for pending calls to finish, then close the database connections"""
+        self._executor.shutdown(wait=True)
+        self.db.close()
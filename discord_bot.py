@@ -2,12 +2,73 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import asyncio
-import aiohttp
+import hashlib
 import json
+import time
 from datetime import datetime, timedelta
-from config import TOKEN, ADMIN_ROLE_ID, OFFICER_ROLE_ID, DATABASE_FILE, CLAN1_ROLE_ID, CLAN2_ROLE_ID
-from database import Database
+from config import TOKEN, ADMIN_ROLE_ID, OFFICER_ROLE_ID, DATABASE_FILE
+import config
+from database import Database, AsyncDatabase
+from afk_reaper import AfkReaper
+from afk_retention import RetentionJob
+from clans import ClanMembership, ClanRegistry
+from raid_helper import RaidHelperClient, RaidHelperError, missing_signups_matrix, signed_up_ids
+from messages import CursorPaginator, MessageBuilder, Paginator, RenderCache, next_change, send_pages
+from member_export import EXPORT_FORMATS, member_rows, write_name_files
+from afk_import import read_import_file
+from afk_index import AfkEntry
+from metrics import MetricsServer, command_failed, instrument_commands, monitor_event_loop
 import os
+import logging
+from bot_logging import setup_logging, shutdown_logging
+
+# Optional settings, older config.py files may not define them
+DATABASE_WRITE_BATCH_MS = getattr(config, 'DATABASE_WRITE_BATCH_MS', None)
+DATABASE_TRACE_MS = getattr(config, 'DATABASE_TRACE_MS', None)
+RAID_HELPER_TIMEOUT = getattr(config, 'RAID_HELPER_TIMEOUT', 10)
+RAID_HELPER_CACHE_TTL = getattr(config, 'RAID_HELPER_CACHE_TTL', 60)
+RAID_HELPER_MAX_EVENTS = 10
+HISTORY_PAGE_SIZE = 5
+HISTORY_REASON_LIMIT = 140
+IMPORT_MAX_ENTRIES = 500
+IMPORT_MAX_BYTES = 1024 * 1024
+MEMBER_EXPORT_DIR = getattr(config, 'MEMBER_EXPORT_DIR', None)
+COMMAND_SYNC_GUILD_IDS = getattr(config, 'COMMAND_SYNC_GUILD_IDS', None)
+METRICS_HOST = getattr(config, 'METRICS_HOST', '127.0.0.1')
+METRICS_PORT = getattr(config, 'METRICS_PORT', None)
+AFK_RETENTION_DAYS = getattr(config, 'AFK_RETENTION_DAYS', None)
+AFK_RETENTION_INTERVAL_HOURS = getattr(config, 'AFK_RETENTION_INTERVAL_HOURS', 24)
+LOG_FILE = getattr(config, 'LOG_FILE', 'bot_database.log')
+LOG_LEVEL = getattr(config, 'LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = getattr(config, 'LOG_MAX_BYTES', 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = getattr(config, 'LOG_BACKUP_COUNT', 5)
+LOG_ROTATE_WHEN = getattr(config, 'LOG_ROTATE_WHEN', None)
+LOG_JSON = getattr(config, 'LOG_JSON', True)
+
+def configure_logging():
+    """Queued logging to a rotating file and the console, configured once"""
+    return setup_logging(
+        log_file=LOG_FILE,
+        level=logging.getLevelName(LOG_LEVEL) if isinstance(LOG_LEVEL, str) else LOG_LEVEL,
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT,
+        when=LOG_ROTATE_WHEN,
+        json_format=LOG_JSON
+    )
+
+# Running the bot configures logging before the database is opened below;
+# importing this module (e.g. from the benchmarks) leaves logging alone
+if __name__ == "__main__":
+    configure_logging()
+
+# Clans managed by the bot, from config.CLANS or the CLAN1/CLAN2 role IDs
+clans = ClanRegistry.from_config(config)
+
+# Role and clan membership of guild members, kept current from gateway events
+membership = ClanMembership(clans)
+
+# Rendered AFK lists, reused until the database changes or a listed entry starts or ends
+render_cache = RenderCache()
 
 def clean_name(name):
     return name.replace(" ", "").lower()
@@ -62,6 +123,53 @@ def parse_date(date_str: str, time_str: str) -> datetime:
     except ValueError as e:
         raise ValueError(f"Invalid date or time format: {str(e)}")
 
+def parse_afk_period(start_date: str, start_time: str, end_date: str, end_time: str) -> tuple[datetime, datetime]:
+    """Parse and validate the start and end of an AFK entry, as entered for /afk"""
+    start_datetime = parse_date(start_date, start_time)
+    end_datetime = parse_date(end_date, end_time)
+    current_time = datetime.now()
+
+    # If end date is before start date, add a year to end date
+    if end_datetime < start_datetime:
+        end_datetime = datetime(
+            end_datetime.year + 1,
+            end_datetime.month,
+            end_datetime.day,
+            end_datetime.hour,
+            end_datetime.minute
+        )
+
+    # Validations
+    if end_datetime <= current_time:
+        raise ValueError("The end date/time must be in the future!")
+
+    if end_datetime <= start_datetime:
+        raise ValueError("The end date/time must be after the start date/time!")
+
+    if start_datetime < current_time:
+        raise ValueError("The start date/time cannot be in the past!")
+
+    return start_datetime, end_datetime
+
+def parse_day(date_str: str) -> datetime:
+    """Parse a date (DDMM or DDMMYYYY, optionally with . or /) without moving it into the future"""
+    clean_date = date_str.replace('.', '').replace('/', '')
+    if len(clean_date) not in (4, 8) or not clean_date.isdigit():
+        raise ValueError("Date must be in format: DDMM, DD.MM, DD/MM or DD.MM.YYYY")
+
+    try:
+        year = int(clean_date[4:]) if len(clean_date) == 8 else datetime.now().year
+        return datetime(year, int(clean_date[2:4]), int(clean_date[:2]))
+    except ValueError as e:
+        raise ValueError(f"Invalid date: {str(e)}")
+
+def member_display_name(guild: discord.Guild, user_id) -> str:
+    """Nickname, global name or username of a guild member, by ID"""
+    member = guild.get_member(int(user_id))
+    if member is None:
+        return str(user_id)
+    return member.nick if member.nick else (member.global_name if member.global_name else member.name)
+
 def discord_timestamp(dt: datetime, style: str = 'f') -> str:
     """
     Convert datetime to Discord timestamp format
@@ -82,11 +190,19 @@ class MemberBot(commands.Bot):
         intents.members = True
         intents.message_content = True
         super().__init__(command_prefix='!', intents=intents)
+        self.reaper = None
+        self.retention = None
+        self.metrics_server = None
+        self.metrics_task = None
+
+        # Shared Raid-Helper API client, its session is opened on first use
+        self.raid_helper = RaidHelperClient(timeout=RAID_HELPER_TIMEOUT, cache_ttl=RAID_HELPER_CACHE_TTL)
         
         # Initialize database with explicit path
         try:
             db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATABASE_FILE)
-            self.db = Database(db_path)
+            self.command_hash_file = f"{db_path}.commands.sha256"
+            self.db = AsyncDatabase(Database(db_path, write_batch_ms=DATABASE_WRITE_BATCH_MS, trace_threshold_ms=DATABASE_TRACE_MS))
             print(f"Database initialized at: {db_path}")
         except Exception as e:
             print(f"Failed to initialize database: {e}")
@@ -94,12 +210,113 @@ class MemberBot(commands.Bot):
 
     async def setup_hook(self):
         print(f'Bot is logged in as {self.user}')
+
+        # Expire finished AFK entries in the background
+        self.reaper = AfkReaper(self.db)
+        self.reaper.start()
+
+        # Archive old entries and shrink the database file periodically
+        self.retention = RetentionJob(self.db, AFK_RETENTION_DAYS, AFK_RETENTION_INTERVAL_HOURS * 3600)
+        self.retention.start()
+
+        # Optional Prometheus endpoint with loop lag and gateway latency sampling
+        if METRICS_PORT:
+            self.metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
+            await self.metrics_server.start()
+            self.metrics_task = asyncio.create_task(monitor_event_loop(self))
+
         try:
-            synced = await self.tree.sync()
-            print(f"Synced {len(synced)} command(s)")
+            await self.sync_commands()
         except Exception as e:
             print(f"Error syncing commands: {e}")
 
+    def command_tree_hash(self, guild_ids) -> str:
+        """Hash of the command definitions and the sync targets"""
+        commands = sorted(self.tree.get_commands(), key=lambda command: command.name)
+        try:
+            payload = [command.to_dict(self.tree) for command in commands]
+        except TypeError:
+            # discord.py < 2.4
+            payload = [command.to_dict() for command in commands]
+        data = json.dumps({'guilds': guild_ids, 'commands': payload}, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    async def sync_commands(self):
+        """
+        Sync the command tree with Discord, unless it is unchanged since the last sync
+
+        With COMMAND_SYNC_GUILD_IDS set, commands are registered per guild (available
+        immediately) and the global commands are cleared. Delete the hash file next
+        to the database to force a sync.
+        """
+        guild_ids = sorted(COMMAND_SYNC_GUILD_IDS or [])
+        tree_hash = self.command_tree_hash(guild_ids)
+
+        try:
+            with open(self.command_hash_file, 'r', encoding='utf-8') as f:
+                if f.read().strip() == tree_hash:
+                    print("Commands unchanged, skipping sync")
+                    return
+        except FileNotFoundError:
+            pass
+
+        if guild_ids:
+            for guild_id in guild_ids:
+                guild = discord.Object(id=guild_id)
+                self.tree.copy_global_to(guild=guild)
+                synced = await self.tree.sync(guild=guild)
+                print(f"Synced {len(synced)} command(s) to guild {guild_id}")
+            # Remove the global copies so commands are not listed twice
+            self.tree.clear_commands(guild=None)
+            await self.tree.sync()
+        else:
+            synced = await self.tree.sync()
+            print(f"Synced {len(synced)} command(s)")
+
+        with open(self.command_hash_file, 'w', encoding='utf-8') as f:
+            f.write(tree_hash)
+
+    async def close(self):
+        if self.reaper is not None:
+            await self.reaper.stop()
+        if self.retention is not None:
+            await self.retention.stop()
+        if self.metrics_task is not None:
+            self.metrics_task.cancel()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.raid_helper.close()
+        await super().close()
+        self.db.close()
+
+    async def on_guild_available(self, guild):
+        membership.load_guild(guild)
+        print(f"Indexed {guild.member_count} members of {guild.name}")
+
+    async def on_guild_join(self, guild):
+        # Joined while running: no on_guild_available follows for this guild
+        membership.load_guild(guild)
+        print(f"Indexed {guild.member_count} members of {guild.name}")
+
+    async def on_guild_unavailable(self, guild):
+        membership.remove_guild(guild.id)
+
+    async def on_guild_remove(self, guild):
+        membership.remove_guild(guild.id)
+
+    async def on_member_join(self, member):
+        membership.update_member(member)
+
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            membership.update_member(after)
+
+    async def on_member_remove(self, member):
+        membership.remove_member(member)
+
+    async def on_guild_role_delete(self, role):
+        membership.remove_role(role)
+
 # Create bot instance
 bot = MemberBot()
 
@@ -110,50 +327,53 @@ def has_required_role():
     return app_commands.check(predicate)
 
 @bot.tree.command(name="getmembers", description="Lists all members with a specific role")
-@app_commands.describe(role="The role to check members for")
+@app_commands.describe(
+    role="The role to check members for",
+    export="Optional: send the list as a CSV or JSON file instead of chat messages"
+)
+@app_commands.choices(export=[
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="JSON", value="json")
+])
 @has_required_role()
-async def get_members(interaction: discord.Interaction, role: discord.Role):
+async def get_members(interaction: discord.Interaction, role: discord.Role, export: app_commands.Choice[str] = None):
     try:
         await interaction.response.defer()
 
-        # Create lists for different name types
-        members_info = []
-        for member in role.members:
-            display_name = member.nick if member.nick else (member.global_name if member.global_name else None)
-            
-            members_info.append({
-                'username': member.name,
-                'display_name': display_name
-            })
-        
-        # Sort by username
-        members_info.sort(key=lambda x: x['username'].lower())
+        # Sorted by username
+        members_info = member_rows(membership.members(role))
 
-        # Save all discord members
-        with open('discord_usernames.txt', 'w', encoding='utf-8') as f:
-            for member in members_info:
-                f.write(f"{member['username']}\n")
+        # Optionally save the name lists next to the bot
+        if MEMBER_EXPORT_DIR:
+            await write_name_files(MEMBER_EXPORT_DIR, members_info)
 
-        with open('current_players.txt', 'w', encoding='utf-8') as f:
-            for member in members_info:
-                if member['display_name']:
-                    f.write(f"{member['display_name']}\n")
+        if export is not None:
+            # Send the whole list as one attachment
+            buffer = EXPORT_FORMATS[export.value](members_info)
+            filename = f"{clean_name(role.name)}_members.{export.value}"
+            await interaction.followup.send(
+                f"**Members with role {role.name} ({len(members_info)}):**",
+                file=discord.File(buffer, filename=filename)
+            )
+            return
 
         # Create message
-        message = f"**Members with role {role.name} ({len(members_info)}):**\n\n"
+        message = MessageBuilder(
+            header=f"**Members with role {role.name} ({len(members_info)}):**\n\n",
+            continued_header=f"**Members with role {role.name} (continued):**\n\n"
+        )
         for member in members_info:
             if member['display_name']:
-                message += f"{member['display_name']} ({member['username']})\n"
+                message.add(f"{member['display_name']} ({member['username']})\n")
 
-        # Send message (split if too long)
-        if len(message) > 2000:
-            chunks = [message[i:i+1900] for i in range(0, len(message), 1900)]
-            for chunk in chunks:
-                await interaction.followup.send(chunk)
-        else:
-            await interaction.followup.send(message)
+        # Send message (one page at a time if too long)
+        paginator = Paginator.from_builder(
+            message, owner_id=interaction.user.id, filename=f"{clean_name(role.name)}_members.txt"
+        )
+        await paginator.send(interaction)
 
     except Exception as e:
+        command_failed(interaction)
         if not interaction.response.is_done():
             await interaction.response.send_message(f"An error occurred: {str(e)}")
         else:
@@ -169,67 +389,127 @@ async def checksignups(interaction: discord.Interaction, role: discord.Role, eve
     try:
         await interaction.response.defer()
 
-        # Get all members with their IDs from the role
-        role_members = {}
-        for member in role.members:
-            display_name = member.nick if member.nick else (member.global_name if member.global_name else member.name)
-            role_members[str(member.id)] = display_name
-
-        # Construct Raid-Helper API URL
-        api_url = f"https://raid-helper.dev/api/v2/events/{event_id}"
+        # Get the IDs of all members with the role
+        role_member_ids = {str(user_id) for user_id in membership.member_ids(role)}
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url) as response:
-                    if response.status == 200:
-                        event_data = await response.json()
-                        
-                        # Get signed up player IDs from Raid-Helper
-                        signed_up_ids = set()
-                        if 'signUps' in event_data:
-                            for signup in event_data['signUps']:
-                                if 'userId' in signup:
-                                    signed_up_ids.add(str(signup['userId']))
-
-                        # Find members who haven't signed up by comparing IDs
-                        not_signed_up = []
-                        for user_id, display_name in role_members.items():
-                            if user_id not in signed_up_ids:
-                                not_signed_up.append(display_name)
-
-                        # Sort names alphabetically
-                        not_signed_up.sort()
-
-                        # Create message
-                        message = f"**Raid-Helper Comparison Results for '{role.name}':**\n"
-                        message += f"Event ID: {event_id}\n\n"
-                        
-                        if not_signed_up:
-                            message += "**Not Signed Up Players:**\n"
-                            for name in not_signed_up:
-                                message += f"{name}\n"
-                        else:
-                            message += "All players are signed up! 🎉\n"
-
-                        message += f"\n**Statistics:**\n"
-                        message += f"Signed up: {len(signed_up_ids)}\n"
-                        message += f"Not signed up: {len(not_signed_up)}\n"
-                        message += f"Total Discord members: {len(role_members)}\n"
-
-                    else:
-                        message = f"Error loading Raid-Helper data: HTTP {response.status}"
+            event_data = await bot.raid_helper.get_event(event_id)
+            
+            # Get signed up player IDs from Raid-Helper
+            signed_up = signed_up_ids(event_data)
+
+            # Find members who haven't signed up by comparing IDs
+            not_signed_up = [member_display_name(role.guild, user_id) for user_id in role_member_ids - signed_up]
+
+            # Sort names alphabetically
+            not_signed_up.sort()
+
+            # Create message
+            message = MessageBuilder(
+                header=f"**Raid-Helper Comparison Results for '{role.name}':**\nEvent ID: {event_id}\n\n",
+                continued_header=f"**Raid-Helper Comparison Results for '{role.name}' (continued):**\n\n"
+            )
+            
+            if not_signed_up:
+                message.add("**Not Signed Up Players:**\n")
+                for name in not_signed_up:
+                    message.add(f"{name}\n")
+            else:
+                message.add("All players are signed up! 🎉\n")
+
+            message.add(
+                f"\n**Statistics:**\n",
+                f"Signed up: {len(signed_up)}\n",
+                f"Not signed up: {len(not_signed_up)}\n",
+                f"Total Discord members: {len(role_member_ids)}\n"
+            )
+            paginator = Paginator.from_builder(
+                message, owner_id=interaction.user.id, filename=f"{clean_name(role.name)}_signups.txt"
+            )
+
+        except RaidHelperError as e:
+            paginator = Paginator.from_pages([f"Error loading Raid-Helper data: {str(e)}"])
         except Exception as e:
-            message = f"Error processing Raid-Helper data: {str(e)}"
+            paginator = Paginator.from_pages([f"Error processing Raid-Helper data: {str(e)}"])
 
-        # Send message (split if too long)
-        if len(message) > 2000:
-            chunks = [message[i:i+1900] for i in range(0, len(message), 1900)]
-            for chunk in chunks:
-                await interaction.followup.send(chunk)
+        # Send message (one page at a time if too long)
+        await paginator.send(interaction)
+
+    except Exception as e:
+        command_failed(interaction)
+        if not interaction.response.is_done():
+            await interaction.response.send_message(f"An error occurred: {str(e)}")
         else:
-            await interaction.followup.send(message)
+            await interaction.followup.send(f"An error occurred: {str(e)}")
+
+@bot.tree.command(name="checksignupsweek", description="Compares role members with the signups of several Raid-Helper events")
+@app_commands.describe(
+    role="The role to check members for",
+    event_ids="Raid-Helper event IDs, separated by spaces or commas"
+)
+@has_required_role()
+async def checksignupsweek(interaction: discord.Interaction, role: discord.Role, event_ids: str):
+    try:
+        await interaction.response.defer()
+
+        ids = list(dict.fromkeys(event_ids.replace(',', ' ').split()))
+        if not ids:
+            await interaction.followup.send("❌ Please provide at least one event ID!", ephemeral=True)
+            return
+        if len(ids) > RAID_HELPER_MAX_EVENTS:
+            await interaction.followup.send(
+                f"❌ At most {RAID_HELPER_MAX_EVENTS} events can be checked at once!",
+                ephemeral=True
+            )
+            return
+
+        # Get the IDs of all members with the role
+        role_member_ids = {str(user_id) for user_id in membership.member_ids(role)}
+
+        # Fetch all events concurrently
+        results = await bot.raid_helper.get_events(ids)
+        events = {event_id: data for event_id, data in results.items() if not isinstance(data, RaidHelperError)}
+        failed = {event_id: error for event_id, error in results.items() if isinstance(error, RaidHelperError)}
+
+        # Members x events in one pass
+        missing = missing_signups_matrix(role_member_ids, events)
+        missing_names = {user_id: member_display_name(role.guild, user_id) for user_id in missing}
+        event_numbers = {event_id: number for number, event_id in enumerate(events, start=1)}
+
+        message = MessageBuilder(
+            header=f"**Raid-Helper Comparison Results for '{role.name}' ({len(events)} events):**\n",
+            continued_header=f"**Raid-Helper Comparison Results for '{role.name}' (continued):**\n"
+        )
+        for event_id, event_data in events.items():
+            title = event_data.get('title') or event_data.get('displayTitle') or ""
+            missing_count = sum(1 for absent in missing.values() if event_id in absent)
+            message.add(f"`{event_numbers[event_id]}` {event_id} {title} - not signed up: {missing_count}\n")
+        for event_id, error in failed.items():
+            message.add(f"⚠️ {event_id}: Error loading Raid-Helper data: {str(error)}\n")
+
+        if events:
+            if missing:
+                message.add("\n**Missing Signups** (✅ signed up, ❌ missing):\n")
+                for user_id in sorted(missing, key=lambda user_id: missing_names[user_id].lower()):
+                    row = "".join("❌" if event_id in missing[user_id] else "✅" for event_id in events)
+                    message.add(f"{row} {missing_names[user_id]}\n")
+            else:
+                message.add("\nAll players are signed up for every event! 🎉\n")
+
+        message.add(
+            f"\n**Statistics:**\n",
+            f"Players missing at least one event: {len(missing)}\n",
+            f"Total Discord members: {len(role_member_ids)}\n"
+        )
+
+        # Send message (one page at a time if too long)
+        paginator = Paginator.from_builder(
+            message, owner_id=interaction.user.id, filename=f"{clean_name(role.name)}_signups.txt"
+        )
+        await paginator.send(interaction)
 
     except Exception as e:
+        command_failed(interaction)
         if not interaction.response.is_done():
             await interaction.response.send_message(f"An error occurred: {str(e)}")
         else:
@@ -245,52 +525,13 @@ async def checksignups(interaction: discord.Interaction, role: discord.Role, eve
 )
 async def afk(interaction: discord.Interaction, start_date: str, start_time: str, end_date: str, end_time: str, reason: str):
     try:
-        # Parse dates
-        start_datetime = parse_date(start_date, start_time)
-        end_datetime = parse_date(end_date, end_time)
-        current_time = datetime.now()
-
-        # If end date is before start date, add a year to end date
-        if end_datetime < start_datetime:
-            end_datetime = datetime(
-                end_datetime.year + 1,
-                end_datetime.month,
-                end_datetime.day,
-                end_datetime.hour,
-                end_datetime.minute
-            )
-
-        # Validations
-        if end_datetime <= current_time:
-            await interaction.response.send_message(
-                "❌ The end date/time must be in the future!",
-                ephemeral=True
-            )
-            return
-
-        if end_datetime <= start_datetime:
-            await interaction.response.send_message(
-                "❌ The end date/time must be after the start date/time!",
-                ephemeral=True
-            )
-            return
-
-        if start_datetime < current_time:
-            await interaction.response.send_message(
-                "❌ The start date/time cannot be in the past!",
-                ephemeral=True
-            )
-            return
+        # Parse and validate dates
+        start_datetime, end_datetime = parse_afk_period(start_date, start_time, end_date, end_time)
 
         # Check clan role
-        user_roles = interaction.user.roles
-        clan_role_id = None
-        if any(role.id == CLAN1_ROLE_ID for role in user_roles):
-            clan_role_id = CLAN1_ROLE_ID
-        elif any(role.id == CLAN2_ROLE_ID for role in user_roles):
-            clan_role_id = CLAN2_ROLE_ID
+        clan = membership.clan_of(interaction.user)
             
-        if clan_role_id is None:
+        if clan is None:
             await interaction.response.send_message(
                 "❌ You must be a member of a clan to use this command!",
                 ephemeral=True
@@ -298,13 +539,13 @@ async def afk(interaction: discord.Interaction, start_date: str, start_time: str
             return
 
         # Store AFK info in database
-        bot.db.set_afk(
+        await bot.db.set_afk(
             user_id=interaction.user.id,
             display_name=interaction.user.display_name,
             start_date=start_datetime,
             end_date=end_datetime,
             reason=reason,
-            clan_role_id=clan_role_id
+            clan_role_id=clan.role_id
         )
         
         await interaction.response.send_message(
@@ -316,11 +557,12 @@ async def afk(interaction: discord.Interaction, start_date: str, start_time: str
     except ValueError as e:
         await interaction.response.send_message(f"❌ {str(e)}", ephemeral=True)
     except Exception as e:
+        command_failed(interaction)
         await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
 @bot.tree.command(name="unafk", description="Remove your AFK status")
 async def unafk(interaction: discord.Interaction):
-    if bot.db.remove_afk(interaction.user.id):
+    if await bot.db.remove_afk(interaction.user.id):
         await interaction.response.send_message(
             f"✅ Removed AFK status for {interaction.user.display_name}"
         )
@@ -337,33 +579,34 @@ async def listafk(interaction: discord.Interaction):
         is_admin = any(role.id in [ADMIN_ROLE_ID, OFFICER_ROLE_ID] for role in interaction.user.roles)
         
         # For regular users, check clan membership
-        user_roles = interaction.user.roles
-        user_clan_role_id = None
-        
-        if any(role.id == CLAN1_ROLE_ID for role in user_roles):
-            user_clan_role_id = CLAN1_ROLE_ID
-        elif any(role.id == CLAN2_ROLE_ID for role in user_roles):
-            user_clan_role_id = CLAN2_ROLE_ID
+        user_clan = membership.clan_of(interaction.user)
             
-        if not is_admin and user_clan_role_id is None:
+        if not is_admin and user_clan is None:
             await interaction.response.send_message(
                 "❌ You must be a member of a clan to use this command!",
                 ephemeral=True
             )
             return
 
+        # Reuse the rendered list while nothing on it has changed
+        current_time = int(time.time())
+        version = bot.db.data_version
+        cache_key = ("listafk", "all" if is_admin else user_clan.role_id)
+        pages = render_cache.get(cache_key, version, current_time)
+        if pages is not None:
+            await send_pages(interaction, pages)
+            return
+
         # Create message
-        message = "**Currently AFK Users:**\n\n"
-        current_time = datetime.now()
+        message = MessageBuilder(header="**Currently AFK Users:**\n\n")
+        listed = []
 
-        # Function to format AFK users for a clan
+        # Function to add AFK users for a clan, one entry per user
         def format_clan_afk_users(afk_users):
-            formatted_msg = ""
+            listed.extend(afk_users)
             for user in afk_users:
-                user_id, display_name, start_date_str, end_date_str, reason, created_at = user
-                start_date = datetime.strptime(start_date_str, "%Y-%m-%d %H:%M:%S")
-                end_date = datetime.strptime(end_date_str, "%Y-%m-%d %H:%M:%S")
-                
+                user_id, display_name, start_date, end_date, reason, created_at = user
+
                 # Determine status based on current time and dates
                 status = "🟢"
                 if end_date < current_time:
@@ -371,49 +614,45 @@ async def listafk(interaction: discord.Interaction):
                 elif start_date > current_time:
                     status = "⚪"  # Not started yet
                 
-                formatted_msg += f"{status} **{display_name}**\n"
-                formatted_msg += f"From: <t:{int(start_date.timestamp())}:f> (<t:{int(start_date.timestamp())}:R>)\n"
-                formatted_msg += f"Until: <t:{int(end_date.timestamp())}:f> (<t:{int(end_date.timestamp())}:R>)\n"
-                formatted_msg += f"Reason: {reason}\n\n"
-            return formatted_msg
+                message.add(
+                    f"{status} **{display_name}**\n",
+                    f"From: <t:{start_date}:f> (<t:{start_date}:R>)\n",
+                    f"Until: <t:{end_date}:f> (<t:{end_date}:R>)\n",
+                    f"Reason: {reason}\n\n"
+                )
 
         if is_admin:
-            # Get and display AFK users for each clan
-            clan_configs = [
-                (CLAN1_ROLE_ID, "Requiem Sun"),
-                (CLAN2_ROLE_ID, "Requiem Moon")
-            ]
+            # Get and display AFK users for each clan in one lookup
+            afk_by_clan = await bot.db.get_active_afk_for_clans(clans.role_ids())
             
-            for clan_role_id, clan_name in clan_configs:
-                afk_users = bot.db.get_all_active_afk(clan_role_id)
+            for clan in clans:
+                afk_users = afk_by_clan[clan.role_id]
                 if afk_users:
-                    message += f"__**{clan_name}:**__\n"
-                    message += format_clan_afk_users(afk_users)
-                    message += "─────────────\n"
+                    message.add(f"__**{clan.name}:**__\n")
+                    format_clan_afk_users(afk_users)
+                    message.write("─────────────\n")
         else:
             # Regular users only see their own clan
-            clan_name = "Requiem Sun" if user_clan_role_id == CLAN1_ROLE_ID else "Requiem Moon"
-            afk_users = bot.db.get_all_active_afk(user_clan_role_id)
+            afk_users = await bot.db.get_all_active_afk(user_clan.role_id)
             
             if not afk_users:
-                await interaction.response.send_message(f"No users from {clan_name} are currently AFK!")
+                pages = [f"No users from {user_clan.name} are currently AFK!"]
+                render_cache.put(cache_key, version, None, pages)
+                await interaction.response.send_message(pages[0])
                 return
                 
-            message += f"__**{clan_name}:**__\n"
-            message += format_clan_afk_users(afk_users)
-
-        # Send message (split if too long)
-        if len(message) > 2000:
-            chunks = [message[i:i+1900] for i in range(0, len(message), 1900)]
-            for i, chunk in enumerate(chunks):
-                if i == 0:
-                    await interaction.response.send_message(chunk)
-                else:
-                    await interaction.followup.send(chunk)
-        else:
-            await interaction.response.send_message(message)
+            message.add(f"__**{user_clan.name}:**__\n")
+            format_clan_afk_users(afk_users)
+
+        # Statuses change when a listed entry starts or ends
+        pages = message.pages()
+        render_cache.put(cache_key, version, next_change(listed, current_time, 2, 3), pages)
+
+        # Send message (split between entries if too long)
+        await send_pages(interaction, pages)
 
     except Exception as e:
+        command_failed(interaction)
         await interaction.response.send_message(
             f"❌ An error occurred: {str(e)}",
             ephemeral=True
@@ -426,20 +665,16 @@ async def afkstats(interaction: discord.Interaction):
         await interaction.response.defer()
 
         message = "**AFK Statistics:**\n\n"
-        current_time = datetime.now()
 
-        # Get stats for each clan
-        clan_configs = [
-            (CLAN1_ROLE_ID, "Requiem Sun"),
-            (CLAN2_ROLE_ID, "Requiem Moon")
-        ]
+        # Get stats for all clans in one query
+        stats_by_clan = await bot.db.get_afk_statistics_for_clans(clans.role_ids())
 
-        for clan_role_id, clan_name in clan_configs:
-            stats = bot.db.get_afk_statistics(clan_role_id)
+        for clan in clans:
+            stats = stats_by_clan[clan.role_id]
             if stats:
                 total_afk, unique_users, active_now, scheduled_future, avg_duration = stats
                 
-                message += f"__**{clan_name}:**__\n"
+                message += f"__**{clan.name}:**__\n"
                 message += f"Total AFK entries: {total_afk}\n"
                 message += f"Unique users: {unique_users}\n"
                 message += f"Currently AFK: {active_now}\n"
@@ -451,6 +686,7 @@ async def afkstats(interaction: discord.Interaction):
         await interaction.followup.send(message)
 
     except Exception as e:
+        command_failed(interaction)
         if not interaction.response.is_done():
             await interaction.response.send_message(
                 f"❌ An error occurred: {str(e)}",
@@ -462,78 +698,173 @@ async def afkstats(interaction: discord.Interaction):
                 ephemeral=True
             )
 
-@bot.tree.command(name="afkhistory", description="Show AFK history for a user (Admin only)")
-@app_commands.describe(user="The user to check history for")
+@bot.tree.command(name="afkstatsrebuild", description="Recompute AFK statistics from scratch and verify them (Admin only)")
 @has_required_role()
-async def afkhistory(interaction: discord.Interaction, user: discord.Member):
+async def afkstatsrebuild(interaction: discord.Interaction):
     try:
-        await interaction.response.defer()
-        
-        # Get user's AFK history from database
-        history = bot.db.get_user_afk_history(user.id)
-        
-        if not history:
+        await interaction.response.defer(ephemeral=True)
+
+        mismatches = await bot.db.rebuild_statistics()
+
+        if not mismatches:
+            message = "✅ AFK statistics rebuilt, cached values matched"
+        else:
+            message = f"⚠️ AFK statistics rebuilt, {len(mismatches)} cached value(s) were wrong:\n"
+            for clan_role_id, column, cached, actual in mismatches[:20]:
+                message += f"<@&{clan_role_id}> {column}: {cached} → {actual}\n"
+
+        await interaction.followup.send(message, ephemeral=True)
+
+    except Exception as e:
+        command_failed(interaction)
+        await interaction.followup.send(
+            f"❌ An error occurred: {str(e)}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="dbcompact", description="Rebuild the database file once so freed space can be returned (Admin only)")
+@has_required_role()
+async def dbcompact(interaction: discord.Interaction):
+    try:
+        await interaction.response.defer(ephemeral=True)
+
+        # Rewrites the whole file; other database writes wait until it is done
+        if await bot.db.enable_incremental_vacuum():
+            message = "✅ Database file rebuilt, freed space is now returned by the retention job"
+        else:
+            message = "✅ Incremental vacuum is already enabled, nothing to do"
+        freed = await bot.db.incremental_vacuum()
+        if freed:
+            message += f"\nFreed {freed} database pages"
+
+        await interaction.followup.send(message, ephemeral=True)
+
+    except Exception as e:
+        command_failed(interaction)
+        await interaction.followup.send(
+            f"❌ An error occurred: {str(e)}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="dbtrace", description="Show the database statements with the most total time (Admin only)")
+@app_commands.describe(reset="Clear the collected statistics after showing them")
+@has_required_role()
+async def dbtrace(interaction: discord.Interaction, reset: bool = False):
+    try:
+        await interaction.response.defer(ephemeral=True)
+
+        if DATABASE_TRACE_MS is None:
             await interaction.followup.send(
-                f"No AFK history found for {user.display_name}",
+                "❌ Statement tracing is disabled, set DATABASE_TRACE_MS in config.py to enable it",
                 ephemeral=True
             )
             return
 
-        # Create message
-        message = f"**AFK History for {user.display_name}:**\n\n"
-        current_time = datetime.now()
-        
-        for entry in history:
-            display_name, start_date_str, end_date_str, reason, created_at, ended_at, clan_role_id = entry
-            
-            # Convert strings to datetime objects
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d %H:%M:%S")
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d %H:%M:%S")
-            created_datetime = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S")
-            
-            # Determine clan name
-            clan_name = "Requiem Sun" if clan_role_id == CLAN1_ROLE_ID else "Requiem Moon"
-            
-            # Determine status
-            status = "🟢"
-            if end_date < current_time:
-                status = "🔴"
-            elif start_date > current_time:
-                status = "⚪"
-            
-            message += f"{status} **{clan_name}**\n"
-            message += f"Created: <t:{int(created_datetime.timestamp())}:f>\n"
-            message += f"From: <t:{int(start_date.timestamp())}:f>\n"
-            message += f"Until: <t:{int(end_date.timestamp())}:f>\n"
-            message += f"Reason: {reason}\n"
-            
-            if ended_at:
-                ended_datetime = datetime.strptime(ended_at, "%Y-%m-%d %H:%M:%S")
-                message += f"Ended early: <t:{int(ended_datetime.timestamp())}:f>\n"
-            
-            # Calculate duration
-            planned_duration = end_date - start_date
-            message += f"Planned duration: {planned_duration.days} days, {planned_duration.seconds//3600} hours\n"
-            
-            if ended_at:
-                actual_end = ended_datetime if ended_datetime < end_date else end_date
-                actual_duration = actual_end - start_date
-                message += f"Actual duration: {actual_duration.days} days, {actual_duration.seconds//3600} hours\n"
-            
-            message += "─────────────\n"
-
-        # Send message (split if too long)
-        if len(message) > 2000:
-            chunks = [message[i:i+1900] for i in range(0, len(message), 1900)]
-            for i, chunk in enumerate(chunks):
-                if i == 0:
-                    await interaction.followup.send(chunk)
-                else:
-                    await interaction.followup.send(chunk)
-        else:
-            await interaction.followup.send(message)
+        statements = await bot.db.query_stats(limit=10)
+        message = MessageBuilder(header=f"**Top database statements by total time** (slow: ≥ {DATABASE_TRACE_MS} ms)\n\n")
+        for statement in statements:
+            shape = statement.shape if len(statement.shape) <= 300 else statement.shape[:300] + "…"
+            message.add(
+                f"**{statement.total_ms:.1f} ms** total, {statement.calls} calls, "
+                f"max {statement.max_ms:.1f} ms, {statement.rows} rows, {statement.slow_calls} slow\n",
+                f"```sql\n{shape}\n```"
+            )
+        if not statements:
+            message.add("No statements recorded yet.")
+
+        if reset:
+            await bot.db.reset_query_stats()
+
+        await send_pages(interaction, message.pages(), ephemeral=True)
 
     except Exception as e:
+        command_failed(interaction)
+        await interaction.followup.send(
+            f"❌ An error occurred: {str(e)}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="afkhistory", description="Show AFK history for a user (Admin only)")
+@app_commands.describe(
+    user="The user to check history for",
+    include_archived="Also show entries moved to the archive by the retention job"
+)
+@has_required_role()
+async def afkhistory(interaction: discord.Interaction, user: discord.Member, include_archived: bool = False):
+    try:
+        await interaction.response.defer()
+
+        async def fetch_page(before, after):
+            # Reuse the rendered page while nothing in it has changed
+            current_time = int(time.time())
+            version = bot.db.data_version
+            cache_key = ("afkhistory", user.id, user.display_name, include_archived, before, after)
+            page = render_cache.get(cache_key, version, current_time)
+            if page is not None:
+                return page
+
+            # Get one page of the user's AFK history from database
+            history, older, newer = await bot.db.get_user_afk_history_page(
+                user.id, HISTORY_PAGE_SIZE, before, after, include_archived
+            )
+
+            if not history:
+                if before is None and after is None:
+                    return f"No AFK history found for {user.display_name}", None, None
+                return f"No further AFK history for {user.display_name}", older, newer
+
+            # Create message
+            message = MessageBuilder(header=f"**AFK History for {user.display_name}:**\n\n")
+
+            for entry in history:
+                display_name, start_date, end_date, reason, created_at, ended_at, clan_role_id = entry
+
+                # Determine clan name
+                clan_name = clans.name(clan_role_id)
+
+                # Determine status
+                status = "🟢"
+                if end_date < current_time:
+                    status = "🔴"
+                elif start_date > current_time:
+                    status = "⚪"
+
+                # Keep a full page within one message
+                if reason and len(reason) > HISTORY_REASON_LIMIT:
+                    reason = reason[:HISTORY_REASON_LIMIT - 1] + "…"
+
+                message.add(
+                    f"{status} **{clan_name}**\n",
+                    f"Created: <t:{created_at}:f>\n",
+                    f"From: <t:{start_date}:f>\n",
+                    f"Until: <t:{end_date}:f>\n",
+                    f"Reason: {reason}\n"
+                )
+
+                if ended_at:
+                    message.write(f"Ended early: <t:{ended_at}:f>\n")
+
+                # Calculate duration
+                planned_duration = timedelta(seconds=end_date - start_date)
+                message.write(f"Planned duration: {planned_duration.days} days, {planned_duration.seconds//3600} hours\n")
+
+                if ended_at:
+                    actual_end = min(ended_at, end_date)
+                    actual_duration = timedelta(seconds=actual_end - start_date)
+                    message.write(f"Actual duration: {actual_duration.days} days, {actual_duration.seconds//3600} hours\n")
+
+                message.write("─────────────\n")
+
+            # Statuses change when an entry starts or ends
+            page = (message.pages()[0], older, newer)
+            render_cache.put(cache_key, version, next_change(history, current_time, 1, 2), page)
+            return page
+
+        # Newer/older buttons fetch each page when it is shown
+        await CursorPaginator(fetch_page, owner_id=interaction.user.id).send(interaction)
+
+    except Exception as e:
+        command_failed(interaction)
         if not interaction.response.is_done():
             await interaction.response.send_message(
                 f"❌ An error occurred: {str(e)}",
@@ -549,10 +880,18 @@ async def afkhistory(interaction: discord.Interaction, user: discord.Member):
 async def myafk(interaction: discord.Interaction):
     try:
         # Get current time for comparison
-        current_time = datetime.now()
+        current_time = int(time.time())
+
+        # Reuse the rendered status while nothing in it has changed
+        version = bot.db.data_version
+        cache_key = ("myafk", interaction.user.id)
+        pages = render_cache.get(cache_key, version, current_time)
+        if pages is not None:
+            await send_pages(interaction, pages)
+            return
         
         # Get user's AFK entries from database
-        afk_entries = bot.db.get_user_active_afk(interaction.user.id)
+        afk_entries = await bot.db.get_user_active_afk(interaction.user.id)
         
         if not afk_entries:
             await interaction.response.send_message(
@@ -562,13 +901,10 @@ async def myafk(interaction: discord.Interaction):
             return
 
         # Create message
-        message = "**Your AFK Status:**\n\n"
+        message = MessageBuilder(header="**Your AFK Status:**\n\n")
         
         for entry in afk_entries:
-            display_name, start_date_str, end_date_str, reason, created_at, clan_role_id = entry
-            
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d %H:%M:%S")
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d %H:%M:%S")
+            display_name, start_date, end_date, reason, created_at, clan_role_id = entry
             
             # Determine status
             status = "🟢"  # Current
@@ -578,17 +914,24 @@ async def myafk(interaction: discord.Interaction):
                 status = "⚪"  # Future
             
             # Get clan name
-            clan_name = "Requiem Sun" if clan_role_id == CLAN1_ROLE_ID else "Requiem Moon"
+            clan_name = clans.name(clan_role_id)
             
-            message += f"{status} **{clan_name}**\n"
-            message += f"From: <t:{int(start_date.timestamp())}:f>\n"
-            message += f"Until: <t:{int(end_date.timestamp())}:f>\n"
-            message += f"Reason: {reason}\n"
-            message += "─────────────\n"
+            message.add(
+                f"{status} **{clan_name}**\n",
+                f"From: <t:{start_date}:f>\n",
+                f"Until: <t:{end_date}:f>\n",
+                f"Reason: {reason}\n",
+                "─────────────\n"
+            )
 
-        await interaction.response.send_message(message)
+        # Statuses change when an entry starts or ends
+        pages = message.pages()
+        render_cache.put(cache_key, version, next_change(afk_entries, current_time, 1, 2), pages)
+
+        await send_pages(interaction, pages)
 
     except Exception as e:
+        command_failed(interaction)
         await interaction.response.send_message(
             f"❌ An error occurred: {str(e)}",
             ephemeral=True
@@ -609,7 +952,7 @@ async def afkdelete(
         await interaction.response.defer()
 
         # Delete entries and get count of deleted entries
-        deleted_count = bot.db.delete_afk_entries(user.id, all_entries)
+        deleted_count = await bot.db.delete_afk_entries(user.id, all_entries)
 
         if deleted_count > 0:
             message = f"✅ Successfully deleted {deleted_count} AFK "
@@ -622,6 +965,176 @@ async def afkdelete(
         await interaction.followup.send(message)
 
     except Exception as e:
+        command_failed(interaction)
+        await interaction.followup.send(
+            f"❌ An error occurred: {str(e)}",
+            ephemeral=True
+        )
+
+def import_entries(guild: discord.Guild, rows):
+    """
+    Validate rows read from an AFK import file
+
+    Returns:
+        (entries, errors): AfkEntry tuples without ids, and one message per
+        rejected row
+    """
+    entries = []
+    errors = []
+    created_at = int(time.time())
+
+    for line, row in rows:
+        try:
+            try:
+                member = guild.get_member(int(row['user_id']))
+            except ValueError:
+                raise ValueError(f"Invalid user ID {row['user_id']!r}")
+            if member is None:
+                raise ValueError(f"User {row['user_id']} is not a member of this server")
+
+            start_datetime, end_datetime = parse_afk_period(
+                row['start_date'], row['start_time'], row['end_date'], row['end_time']
+            )
+
+            if row.get('clan_role_id'):
+                clan = clans.get(int(row['clan_role_id'])) if row['clan_role_id'].isdigit() else None
+                if clan is None:
+                    raise ValueError(f"{row['clan_role_id']} is not a clan role")
+            else:
+                clan = membership.clan_of(member)
+                if clan is None:
+                    raise ValueError(f"{member.display_name} is not a member of a clan")
+
+            if not row['reason']:
+                raise ValueError("A reason is required")
+
+            entries.append(AfkEntry(
+                id=None,
+                user_id=member.id,
+                display_name=member.display_name,
+                start_date=int(start_datetime.timestamp()),
+                end_date=int(end_datetime.timestamp()),
+                reason=row['reason'],
+                created_at=created_at,
+                clan_role_id=clan.role_id
+            ))
+        except ValueError as e:
+            errors.append(f"Line {line}: {str(e)}")
+
+    return entries, errors
+
+@bot.tree.command(name="afkimport", description="Import AFK entries from a CSV or JSON file (Admin only)")
+@app_commands.describe(file="CSV or JSON file with user_id, start_date, start_time, end_date, end_time and reason")
+@has_required_role()
+async def afkimport(interaction: discord.Interaction, file: discord.Attachment):
+    try:
+        # The first followup replaces the deferred response, so only an ephemeral
+        # defer keeps validation errors (which quote user IDs) private
+        await interaction.response.defer(ephemeral=True)
+
+        if file.size > IMPORT_MAX_BYTES:
+            await interaction.followup.send(f"❌ The file is too large (max {IMPORT_MAX_BYTES // 1024} KiB)", ephemeral=True)
+            return
+
+        try:
+            rows = read_import_file(file.filename, await file.read())
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {str(e)}", ephemeral=True)
+            return
+
+        if not rows:
+            await interaction.followup.send("❌ The file contains no entries", ephemeral=True)
+            return
+
+        if len(rows) > IMPORT_MAX_ENTRIES:
+            await interaction.followup.send(f"❌ Too many entries ({len(rows)}), the limit is {IMPORT_MAX_ENTRIES}", ephemeral=True)
+            return
+
+        entries, errors = import_entries(interaction.guild, rows)
+
+        # All or nothing: a partly imported schedule is harder to fix than a rejected file
+        if errors:
+            message = MessageBuilder(header=f"❌ Nothing imported, {len(errors)} of {len(rows)} entries are invalid:\n")
+            for error in errors[:20]:
+                message.add(f"{error}\n")
+            if len(errors) > 20:
+                message.add(f"... and {len(errors) - 20} more\n")
+            await send_pages(interaction, message.pages(), ephemeral=True)
+            return
+
+        await bot.db.import_afk(entries)
+
+        users = len({entry.user_id for entry in entries})
+        await interaction.followup.send(
+            f"✅ Imported {len(entries)} AFK {'entries' if len(entries) > 1 else 'entry'} "
+            f"for {users} {'users' if users > 1 else 'user'}",
+            ephemeral=True
+        )
+
+    except Exception as e:
+        command_failed(interaction)
+        await interaction.followup.send(
+            f"❌ An error occurred: {str(e)}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="afkbulk", description="Delete or end all AFK entries in a date range (Admin only)")
+@app_commands.describe(
+    action="Delete the entries (archived ones included), or end the active ones now",
+    from_date="First day of the range (DDMM, DD.MM or DD.MM.YYYY)",
+    to_date="Last day of the range (DDMM, DD.MM or DD.MM.YYYY)",
+    clan="Optional: only entries of this clan (default: all clans)"
+)
+@app_commands.choices(action=[
+    app_commands.Choice(name="Delete", value="delete"),
+    app_commands.Choice(name="End", value="end")
+])
+@has_required_role()
+async def afkbulk(
+    interaction: discord.Interaction,
+    action: app_commands.Choice[str],
+    from_date: str,
+    to_date: str,
+    clan: discord.Role = None
+):
+    try:
+        await interaction.response.defer()
+
+        try:
+            start_datetime = parse_day(from_date)
+            # The range includes the whole last day
+            end_datetime = parse_day(to_date) + timedelta(days=1)
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {str(e)}", ephemeral=True)
+            return
+
+        if end_datetime <= start_datetime:
+            await interaction.followup.send("❌ The last day must not be before the first day!", ephemeral=True)
+            return
+
+        if clan is not None and clan.id not in clans:
+            await interaction.followup.send(f"❌ {clan.name} is not a clan role!", ephemeral=True)
+            return
+
+        clan_role_id = clan.id if clan is not None else None
+        if action.value == "delete":
+            count = await bot.db.delete_afk_range(start_datetime, end_datetime, clan_role_id)
+            done = "Deleted"
+        else:
+            count = await bot.db.end_afk_range(start_datetime, end_datetime, clan_role_id)
+            done = "Ended"
+
+        scope = clans.name(clan_role_id) if clan_role_id is not None else "all clans"
+        period = f"<t:{int(start_datetime.timestamp())}:d> to <t:{int(end_datetime.timestamp()) - 1}:d>"
+        if count > 0:
+            message = f"✅ {done} {count} AFK {'entries' if count > 1 else 'entry'} of {scope} from {period}"
+        else:
+            message = f"❌ No {'active ' if action.value == 'end' else ''}AFK entries of {scope} found from {period}"
+
+        await interaction.followup.send(message)
+
+    except Exception as e:
+        command_failed(interaction)
         await interaction.followup.send(
             f"❌ An error occurred: {str(e)}",
             ephemeral=True
@@ -653,15 +1166,9 @@ async def quickafk(interaction: discord.Interaction, reason: str, days: int = No
             end_datetime = (start_datetime + timedelta(days=days)).replace(hour=23, minute=59, second=59)
 
         # Check if user has any clan role
-        user_roles = interaction.user.roles
-        clan_role_id = None
-        
-        if any(role.id == CLAN1_ROLE_ID for role in user_roles):
-            clan_role_id = CLAN1_ROLE_ID
-        elif any(role.id == CLAN2_ROLE_ID for role in user_roles):
-            clan_role_id = CLAN2_ROLE_ID
+        clan = membership.clan_of(interaction.user)
             
-        if clan_role_id is None:
+        if clan is None:
             await interaction.response.send_message(
                 "❌ You must be a member of a clan to use this command!",
                 ephemeral=True
@@ -669,13 +1176,13 @@ async def quickafk(interaction: discord.Interaction, reason: str, days: int = No
             return
 
         # Store AFK info in database
-        bot.db.set_afk(
+        await bot.db.set_afk(
             user_id=interaction.user.id,
             display_name=interaction.user.display_name,
             start_date=start_datetime,
             end_date=end_datetime,
             reason=reason,
-            clan_role_id=clan_role_id
+            clan_role_id=clan.role_id
         )
         
         await interaction.response.send_message(
@@ -685,10 +1192,20 @@ async def quickafk(interaction: discord.Interaction, reason: str, days: int = No
             f"Reason: {reason}"
         )
     except Exception as e:
+        command_failed(interaction)
         await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
+# Time every command handler, after all commands are registered
+instrument_commands(bot.tree)
+
 def run_bot():
-    bot.run(TOKEN)
+    # File I/O happens on the listener thread, never on the event loop
+    configure_logging()
+    try:
+        # log_handler=None keeps discord.py from adding its own handler, its records go through ours
+        bot.run(TOKEN, log_handler=None)
+    finally:
+        shutdown_logging()
 
 if __name__ == "__main__":
     run_bot() 
\ No newline at end of file
@@ -0,0 +1,77 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+
+EXPORT_FIELDS = ["username", "display_name", "id", "roles", "joined_at"]
+
+def member_rows(members):
+    """
+    Export rows for guild members, sorted by username
+
+    Returns:
+        List of dicts with the EXPORT_FIELDS keys
+    """
+    rows = []
+    for member in members:
+        rows.append({
+            'username': member.name,
+            'display_name': member.nick if member.nick else (member.global_name if member.global_name else None),
+            'id': str(member.id),
+            'roles': [role.name for role in member.roles if not role.is_default()],
+            'joined_at': member.joined_at.isoformat() if member.joined_at else None,
+        })
+    rows.sort(key=lambda row: row['username'].lower())
+    return rows
+
+def rows_to_csv(rows) -> io.BytesIO:
+    """Write rows as UTF-8 CSV (roles joined with ';') into an in-memory buffer"""
+    buffer = io.BytesIO()
+    # utf-8-sig so spreadsheet programs detect the encoding
+    text = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
+    writer = csv.DictWriter(text, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({**row, 'roles': ";".join(row['roles']), 'display_name': row['display_name'] or ""})
+    text.flush()
+    text.detach()
+    buffer.seek(0)
+    return buffer
+
+def rows_to_json(rows) -> io.BytesIO:
+    """Write rows as a JSON array into an in-memory buffer"""
+    buffer = io.BytesIO(json.dumps(rows, ensure_ascii=False, indent=2).encode('utf-8'))
+    buffer.seek(0)
+    return buffer
+
+EXPORT_FORMATS = {
+    'csv': rows_to_csv,
+    'json': rows_to_json,
+}
+
+def _write_atomic(path: str, lines):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".export-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(f"{line}\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+async def write_name_files(directory: str, rows):
+    """
+    Write discord_usernames.txt and current_players.txt off the event loop
+
+    Each file is written to a temporary file and renamed into place, so
+    concurrent exports never leave a half-written or interleaved file.
+    """
+    usernames = [row['username'] for row in rows]
+    display_names = [row['display_name'] for row in rows if row['display_name']]
+    await asyncio.to_thread(_write_atomic, os.path.join(directory, 'discord_usernames.txt'), usernames)
+    await asyncio.to_thread(_write_atomic, os.path.join(directory, 'current_players.txt'), display_names)
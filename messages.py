@@ -0,0 +1,341 @@
+import io
+from collections import OrderedDict
+
+import discord
+
+# Discord limits
+MESSAGE_LIMIT = 2000
+
+def _split_oversized(entry: str, limit: int, first_limit: int = None):
+    """
+    Split a single entry longer than limit, on line boundaries where possible
+
+    The first piece is at most first_limit characters (default limit), the
+    rest at most limit, so the first can share a page with what came before.
+    """
+    current = limit if first_limit is None else first_limit
+    chunk = []
+    size = 0
+    for line in entry.splitlines(keepends=True):
+        while len(line) > current - size:
+            if chunk:
+                yield "".join(chunk)
+                chunk, size = [], 0
+                current = limit
+                continue
+            # A single line longer than a page, nothing better than a hard cut
+            yield line[:current]
+            line = line[current:]
+            current = limit
+        chunk.append(line)
+        size += len(line)
+    if chunk:
+        yield "".join(chunk)
+
+def _page_parts(entries, limit: int, header: str, continued_header: str):
+    """The parts of each page as paginate() packs them, without joining them"""
+    pages = []
+    parts = [header]
+    size = len(header)
+
+    for entry in entries:
+        if size + len(entry) > limit and size > len(parts[0]):
+            pages.append(parts)
+            parts = [continued_header]
+            size = len(continued_header)
+
+        if size + len(entry) > limit:
+            # Later pieces start a page after continued_header, not after what came before
+            piece_limit = max(1, limit - len(continued_header))
+            for piece in _split_oversized(entry, piece_limit, max(1, limit - size)):
+                parts.append(piece)
+                pages.append(parts)
+                parts = [continued_header]
+                size = len(continued_header)
+            continue
+
+        parts.append(entry)
+        size += len(entry)
+
+    if size > len(parts[0]) or not pages:
+        pages.append(parts)
+    return pages
+
+def paginate(entries, limit: int = MESSAGE_LIMIT, header: str = "", continued_header: str = ""):
+    """
+    Pack entries into pages of at most limit characters
+
+    Entries are never split across pages unless a single entry is longer
+    than a page, in which case it is split on line boundaries.
+
+    Args:
+        entries: Iterable of strings, each one a unit that should stay together
+        limit: Maximum length of a page
+        header: Text at the start of the first page
+        continued_header: Text at the start of every following page
+
+    Returns:
+        List of page strings (at least one)
+    """
+    return ["".join(parts) for parts in _page_parts(entries, limit, header, continued_header)]
+
+class MessageBuilder:
+    """
+    Collects a response entry by entry and packs it into Discord-sized pages
+
+    Parts are collected in a list and joined once per page, so building a
+    long roster is linear in its size. Each add() starts a new entry that is
+    kept on one page; write() appends to the current entry.
+    """
+
+    def __init__(self, header: str = "", continued_header: str = ""):
+        self.header = header
+        self.continued_header = continued_header
+        self._entries = []
+        self._current = []
+
+    def add(self, *parts: str):
+        """Start a new entry made of parts"""
+        self._flush()
+        self._current.extend(parts)
+        return self
+
+    def write(self, *parts: str):
+        """Append parts to the current entry"""
+        self._current.extend(parts)
+        return self
+
+    def _flush(self):
+        if self._current:
+            self._entries.append("".join(self._current))
+            self._current = []
+
+    def __bool__(self):
+        return bool(self._entries or self._current)
+
+    def entries(self):
+        """All finished entries"""
+        self._flush()
+        return list(self._entries)
+
+    def pages(self, limit: int = MESSAGE_LIMIT):
+        """The response packed into pages of at most limit characters"""
+        return paginate(self.entries(), limit, self.header, self.continued_header)
+
+    def page_parts(self, limit: int = MESSAGE_LIMIT):
+        """The parts of each page, to be joined only when the page is shown"""
+        return _page_parts(self.entries(), limit, self.header, self.continued_header)
+
+async def send_pages(interaction: discord.Interaction, pages, ephemeral: bool = False):
+    """Send every page, as the interaction response first if it has not been answered yet"""
+    for page in pages:
+        if not interaction.response.is_done():
+            await interaction.response.send_message(page, ephemeral=ephemeral)
+        else:
+            await interaction.followup.send(page, ephemeral=ephemeral)
+
+class _OwnedView(discord.ui.View):
+    """View whose buttons only the owner may use, disabled once it times out"""
+
+    def __init__(self, owner_id: int = None, timeout: float = 300):
+        super().__init__(timeout=timeout)
+        self.owner_id = owner_id
+        self.message = None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if self.owner_id is not None and interaction.user.id != self.owner_id:
+            await interaction.response.send_message("❌ Only the person who ran the command can turn pages.", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        if self.message is not None:
+            for item in self.children:
+                item.disabled = True
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+    async def _send(self, interaction: discord.Interaction, content: str, paged: bool, ephemeral: bool):
+        view = self if paged else discord.utils.MISSING
+        if not interaction.response.is_done():
+            await interaction.response.send_message(content, view=view, ephemeral=ephemeral)
+            self.message = await interaction.original_response()
+        else:
+            self.message = await interaction.followup.send(content, view=view, ephemeral=ephemeral, wait=True)
+        if not paged:
+            self.stop()
+
+class Paginator(_OwnedView):
+    """
+    Previous/next buttons over pages that are rendered on first view
+
+    Only the owner turns the shared message; anyone else who presses a
+    button gets the requested page as a private reply. When the buttons
+    time out, every page is attached to the message as a text file, so the
+    whole list stays readable after paging has stopped.
+
+    Args:
+        render: Callable taking a page index and returning the page content
+        page_count: Number of pages
+        owner_id: Only this user may turn the shared message (None for anyone)
+        filename: Name of the file the pages are attached as on timeout
+    """
+
+    def __init__(self, render, page_count: int, owner_id: int = None, timeout: float = 300, filename: str = "pages.txt"):
+        super().__init__(owner_id, timeout)
+        self.render = render
+        self.page_count = page_count
+        self.filename = filename
+        self.index = 0
+        self._rendered = {}
+        self._update_buttons()
+
+    @classmethod
+    def from_pages(cls, pages, owner_id: int = None, timeout: float = 300, filename: str = "pages.txt"):
+        """Paginator over pages that are already rendered"""
+        return cls(pages.__getitem__, len(pages), owner_id, timeout, filename)
+
+    @classmethod
+    def from_builder(cls, message: MessageBuilder, owner_id: int = None, timeout: float = 300, filename: str = "pages.txt"):
+        """Paginator over a MessageBuilder, joining each page only when it is shown"""
+        parts = message.page_parts()
+        return cls(lambda index: "".join(parts[index]), len(parts), owner_id, timeout, filename)
+
+    def page(self, index: int) -> str:
+        if index not in self._rendered:
+            self._rendered[index] = self.render(index)
+        return self._rendered[index]
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self.index >= self.page_count - 1
+        self.page_label.label = f"{self.index + 1}/{self.page_count}"
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Everyone may page; _show() decides between the shared and a private copy
+        return True
+
+    async def _show(self, interaction: discord.Interaction, index: int):
+        index = max(0, min(index, self.page_count - 1))
+        if self.owner_id is not None and interaction.user.id != self.owner_id:
+            await interaction.response.send_message(self.page(index), ephemeral=True)
+            return
+        self.index = index
+        self._update_buttons()
+        await interaction.response.edit_message(content=self.page(self.index), view=self)
+
+    async def on_timeout(self):
+        if self.message is None:
+            return
+        for item in self.children:
+            item.disabled = True
+        content = "\n".join(self.page(index) for index in range(self.page_count))
+        try:
+            await self.message.edit(
+                view=self,
+                attachments=[discord.File(io.BytesIO(content.encode('utf-8')), filename=self.filename)]
+            )
+        except discord.HTTPException:
+            pass
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.index - 1)
+
+    @discord.ui.button(label="1/1", style=discord.ButtonStyle.secondary, disabled=True)
+    async def page_label(self, interaction: discord.Interaction, button: discord.ui.Button):
+        pass
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.index + 1)
+
+    async def send(self, interaction: discord.Interaction, ephemeral: bool = False):
+        """Send the first page, with buttons only when there is more than one page"""
+        await self._send(interaction, self.page(0), self.page_count > 1, ephemeral)
+
+class CursorPaginator(_OwnedView):
+    """
+    Newer/older buttons over keyset-paginated data, each page fetched when it is shown
+
+    Args:
+        fetch: Coroutine function taking (before, after) cursors and returning
+            (content, older, newer), where older/newer are the cursors of the
+            neighbouring pages or None at either end
+        owner_id: Only this user may turn pages (None for anyone)
+    """
+
+    def __init__(self, fetch, owner_id: int = None, timeout: float = 300):
+        super().__init__(owner_id, timeout)
+        self.fetch = fetch
+        self.older = None
+        self.newer = None
+
+    async def _load(self, before=None, after=None) -> str:
+        content, older, newer = await self.fetch(before, after)
+        self.older, self.newer = older, newer
+        self.newer_page.disabled = newer is None
+        self.older_page.disabled = older is None
+        return content
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        content = await self._load(after=self.newer)
+        await interaction.response.edit_message(content=content, view=self)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        content = await self._load(before=self.older)
+        await interaction.response.edit_message(content=content, view=self)
+
+    async def send(self, interaction: discord.Interaction, ephemeral: bool = False):
+        """Send the newest page, with buttons only when there are older pages"""
+        content = await self._load()
+        await self._send(interaction, content, self.older is not None, ephemeral)
+
+class RenderCache:
+    """
+    Rendered responses, valid until the data changes or a point in time passes
+
+    Entries are stored with the data version they were rendered from and
+    the time their content goes stale (for example when a listed AFK entry
+    starts or ends); a lookup with a newer version or a later time misses.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, valid_until, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version: int, now: float):
+        """The cached value for key, or None"""
+        cached = self._entries.get(key)
+        if cached is None or cached[0] != version or (cached[1] is not None and now >= cached[1]):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return cached[2]
+
+    def put(self, key, version: int, valid_until, value):
+        """Store value rendered from data_version version, stale from valid_until (None for never)"""
+        self._entries[key] = (version, valid_until, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+def next_change(rows, now: int, start_index: int, end_index: int):
+    """The earliest start or end time after now among rows, or None"""
+    upcoming = [
+        moment
+        for row in rows
+        for moment in (row[start_index], row[end_index])
+        if moment > now
+    ]
+    return min(upcoming, default=None)
@@ -0,0 +1,278 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+from aiohttp import web
+
+from bot_logging import current_command
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from a cached read to a slow Discord round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """A metric family with optional labels, rendered in the Prometheus text format"""
+    kind = None
+    # Appended to the name of the family and its samples
+    suffix = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, **labels):
+        """The child metric for one combination of label values"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        # Metrics without labels are used directly
+        return self.labels()
+
+    def render(self):
+        name = self.name + self.suffix
+        lines = [f"# HELP {name} {self.documentation}", f"# TYPE {name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(name, list(zip(self.labelnames, key))))
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labels):
+        return [f"{name}{_format_labels(labels)} {_format_value(self.value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+    # Like prometheus_client, the family is named after its _total samples
+    suffix = "_total"
+    _new_child = _CounterChild
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name, labels):
+        return [f"{name}{_format_labels(labels)} {_format_value(float(self.value))}"]
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _new_child = _GaugeChild
+
+    def set(self, value: float):
+        self._default().set(value)
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+            self.sum += value
+            self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            bucket_labels = labels + [("le", _format_value(float(bound)))]
+            lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels + [('le', '+Inf')])} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+class Registry:
+    """The metric families exposed by the metrics endpoint"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+COMMAND_LATENCY = Histogram(
+    "discord_command_duration_seconds", "Time spent in an app command handler", ["command"]
+)
+COMMAND_ERRORS = Counter(
+    "discord_command_errors", "App command invocations that failed", ["command"]
+)
+DATABASE_LATENCY = Histogram(
+    "database_call_duration_seconds", "Time from calling a Database method to its result, including executor wait", ["method"]
+)
+DATABASE_ERRORS = Counter(
+    "database_call_errors", "Database method calls that raised", ["method"]
+)
+RAID_HELPER_LATENCY = Histogram(
+    "raid_helper_request_duration_seconds", "Time until Raid-Helper answered a single HTTP request, by status or error", ["status"]
+)
+RAID_HELPER_ERRORS = Counter(
+    "raid_helper_request_errors", "Raid-Helper HTTP requests that failed, by HTTP status or exception class", ["cause"]
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up a sleeping task",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+GATEWAY_LATENCY = Gauge(
+    "discord_gateway_latency_seconds", "Heartbeat latency of the Discord gateway connection"
+)
+
+# Outcome of the instrumented invocation running in this context, marked by command_failed()
+_command_outcome = contextvars.ContextVar('command_outcome', default=None)
+
+def command_failed(interaction):
+    """Count a failed invocation of the interaction's command and mark its outcome as an error"""
+    command = getattr(interaction, 'command', None)
+    COMMAND_ERRORS.labels(command=command.qualified_name if command else "unknown").inc()
+    outcome = _command_outcome.get()
+    if outcome is not None:
+        outcome['failed'] = True
+
+def instrument_commands(tree):
+    """
+    Time every command registered on the tree
+
+    Must run after all commands have been added. Exceptions that escape a
+    handler are counted as errors; handlers that catch their own errors
+    report them with command_failed(). Records logged while a handler runs
+    carry its name, and each invocation logs its duration.
+    """
+    for command in tree.walk_commands():
+        callback = getattr(command, '_callback', None)
+        if callback is not None and not getattr(callback, '__metrics_wrapped__', False):
+            command._callback = _timed_callback(callback, command.qualified_name)
+
+def _timed_callback(callback, name: str):
+    @functools.wraps(callback)
+    async def timed(*args, **kwargs):
+        token = current_command.set(name)
+        outcome = {'failed': False}
+        outcome_token = _command_outcome.set(outcome)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await callback(*args, **kwargs)
+            # Handlers that caught their own error reported it through command_failed()
+            status = "error" if outcome['failed'] else "ok"
+            return result
+        except Exception:
+            COMMAND_ERRORS.labels(command=name).inc()
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            COMMAND_LATENCY.labels(command=name).observe(duration)
+            logging.info(
+                f"Command {name} finished in {duration * 1000:.1f} ms",
+                extra={'duration_ms': round(duration * 1000, 3), 'status': status}
+            )
+            _command_outcome.reset(outcome_token)
+            current_command.reset(token)
+
+    timed.__metrics_wrapped__ = True
+    return timed
+
+async def monitor_event_loop(bot, interval: float = 0.5):
+    """Sample event loop lag and gateway latency until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+        if bot.latency == bot.latency:  # NaN until the first heartbeat
+            GATEWAY_LATENCY.set(bot.latency)
+
+class MetricsServer:
+    """Serves REGISTRY in the Prometheus text format on http://host:port/metrics"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9100, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode('utf-8'),
+            headers={'Content-Type': CONTENT_TYPE}
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
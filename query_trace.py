@@ -0,0 +1,161 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(sql: str) -> str:
+    """Normalize a statement so calls differing only in literals or IN list length share one shape"""
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _WHITESPACE.sub(" ", shape).strip()
+    return _PLACEHOLDER_LIST.sub("(?, ...)", shape)
+
+class StatementStats(NamedTuple):
+    shape: str
+    calls: int
+    total_ms: float
+    max_ms: float
+    rows: int
+    slow_calls: int
+
+class QueryTracer:
+    """
+    Collects per-statement timings from TracingConnection instances
+
+    Statements slower than threshold_ms have their EXPLAIN QUERY PLAN
+    logged, once per statement shape.
+    """
+
+    def __init__(self, threshold_ms: float = 50):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._stats = {}  # shape -> [calls, total_ms, max_ms, rows, slow_calls]
+        self._explained = set()
+
+    def record(self, conn, sql: str, parameters, elapsed_ms: float, rows: int = 0) -> str:
+        """Record one execution and explain it if it was slow; returns the statement shape"""
+        shape = statement_shape(sql)
+        slow = elapsed_ms >= self.threshold_ms
+        with self._lock:
+            stats = self._stats.setdefault(shape, [0, 0.0, 0.0, 0, 0])
+            stats[0] += 1
+            stats[1] += elapsed_ms
+            stats[2] = max(stats[2], elapsed_ms)
+            stats[3] += max(rows, 0)
+            if slow:
+                stats[4] += 1
+            explain = slow and shape not in self._explained
+            if explain:
+                self._explained.add(shape)
+
+        if explain:
+            self._explain(conn, sql, parameters, shape, elapsed_ms)
+        return shape
+
+    def add_rows(self, shape: str, rows: int, elapsed_ms: float):
+        """Add rows and time spent fetching the results of an execution"""
+        with self._lock:
+            stats = self._stats.get(shape)
+            if stats is not None:
+                stats[1] += elapsed_ms
+                stats[3] += rows
+
+    def _explain(self, conn, sql, parameters, shape, elapsed_ms):
+        try:
+            plan = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        except sqlite3.Error as e:
+            # Not every statement can be explained (PRAGMA, BEGIN, ...)
+            logging.warning(f"Slow statement ({elapsed_ms:.1f} ms): {shape} (no query plan: {e})")
+            return
+        if not plan:
+            logging.warning(f"Slow statement ({elapsed_ms:.1f} ms): {shape}")
+            return
+        details = "\n".join(f"    {row[-1]}" for row in plan)
+        logging.warning(f"Slow statement ({elapsed_ms:.1f} ms): {shape}\n{details}")
+
+    def top(self, limit: int = 10, key: str = 'total_ms'):
+        """The statements with the highest total (or max, calls, rows) time"""
+        with self._lock:
+            stats = [StatementStats(shape, *values) for shape, values in self._stats.items()]
+        stats.sort(key=lambda statement: getattr(statement, key), reverse=True)
+        return stats[:limit]
+
+    def reset(self):
+        """Forget all collected statistics and explained shapes"""
+        with self._lock:
+            self._stats.clear()
+            self._explained.clear()
+
+class TracingCursor(sqlite3.Cursor):
+    """Cursor that reports execution time, fetch time and rows to the connection's tracer"""
+
+    _shape = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._shape = self.connection.tracer.record(self.connection, sql, parameters, elapsed_ms, self.rowcount)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._shape = self.connection.tracer.record(self.connection, sql, (), elapsed_ms, self.rowcount)
+        return self
+
+    def _fetched(self, started: float, rows: int):
+        if self._shape is not None:
+            self.connection.tracer.add_rows(self._shape, rows, (time.perf_counter() - started) * 1000)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._fetched(started, 1)
+        return row
+
+class TracingConnection(sqlite3.Connection):
+    """Connection whose execute helpers go through TracingCursor; pass as sqlite3.connect(factory=...)"""
+
+    tracer = None
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = sqlite3.Cursor if self.tracer is None else TracingCursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        if self.tracer is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.tracer is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from metrics import RAID_HELPER_ERRORS, RAID_HELPER_LATENCY
+
+RAID_HELPER_API_URL = "https://raid-helper.dev/api/v2"
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def signed_up_ids(event_data: dict) -> set:
+    """Discord user IDs (as strings) signed up to an event payload"""
+    return {
+        str(signup['userId'])
+        for signup in event_data.get('signUps', [])
+        if 'userId' in signup
+    }
+
+def missing_signups_matrix(member_ids, events: dict) -> dict:
+    """
+    Work out which events each member has not signed up for
+
+    Args:
+        member_ids: Discord user IDs (as strings) of the role members
+        events: Dict mapping event ID to event payload
+
+    Returns:
+        Dict mapping each member ID that is missing from at least one event
+        to the list of event IDs it is missing from, in the order of events
+    """
+    signups = [(event_id, signed_up_ids(event_data)) for event_id, event_data in events.items()]
+
+    missing = {}
+    for member_id in member_ids:
+        absent = [event_id for event_id, signed_up in signups if member_id not in signed_up]
+        if absent:
+            missing[member_id] = absent
+    return missing
+
+class RaidHelperError(Exception):
+    """Raised when an event cannot be loaded from Raid-Helper"""
+
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+class RaidHelperClient:
+    """
+    Shared client for the Raid-Helper events API
+
+    Owns one aiohttp session for the lifetime of the bot so connections,
+    DNS lookups and TLS sessions are reused. Every request has a timeout and
+    is retried with jittered exponential backoff on timeouts, connection
+    errors, 429 and 5xx; a Retry-After longer than the timeout fails the
+    request instead of waiting for it. Event payloads are cached per event ID for
+    cache_ttl seconds and revalidated with If-None-Match afterwards.
+    """
+
+    def __init__(
+        self,
+        base_url: str = RAID_HELPER_API_URL,
+        timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        cache_ttl: float = 60,
+        cache_size: int = 256,
+        max_connections: int = 10
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.max_connections = max_connections
+
+        self._session = None
+        self._cache = OrderedDict()  # event_id -> (fetched_at, etag, payload)
+        self._inflight = {}          # event_id -> task fetching it
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """Close the underlying session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def get_event(self, event_id: str, use_cache: bool = True) -> dict:
+        """
+        Get an event payload by ID
+
+        Concurrent calls for the same event share one request.
+
+        Raises:
+            RaidHelperError: The event could not be loaded after all retries
+        """
+        event_id = str(event_id)
+
+        cached = self._cache.get(event_id)
+        if use_cache and cached and time.monotonic() - cached[0] < self.cache_ttl:
+            self._cache.move_to_end(event_id)
+            return cached[2]
+
+        task = self._inflight.get(event_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_event(event_id))
+            self._inflight[event_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(event_id, None))
+        return await asyncio.shield(task)
+
+    async def get_events(self, event_ids, concurrency: int = 4) -> dict:
+        """
+        Get several events concurrently, at most concurrency requests at a time
+
+        Returns:
+            Dict mapping each event ID, in the given order, to its payload or
+            to the RaidHelperError raised while loading it
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(event_id):
+            async with semaphore:
+                try:
+                    return await self.get_event(event_id)
+                except RaidHelperError as e:
+                    return e
+
+        event_ids = [str(event_id) for event_id in event_ids]
+        results = await asyncio.gather(*(fetch(event_id) for event_id in event_ids))
+        return dict(zip(event_ids, results))
+
+    async def _fetch_event(self, event_id: str) -> dict:
+        url = f"{self.base_url}/events/{event_id}"
+        cached = self._cache.get(event_id)
+        headers = {}
+        if cached and cached[1]:
+            headers['If-None-Match'] = cached[1]
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                async with self._get_session().get(url, headers=headers) as response:
+                    RAID_HELPER_LATENCY.labels(status=response.status).observe(time.perf_counter() - started)
+                    if response.status == 304 and cached:
+                        self._store(event_id, cached[1], cached[2])
+                        return cached[2]
+
+                    if response.status == 200:
+                        try:
+                            payload = await response.json(content_type=None)
+                        except ValueError as e:
+                            RAID_HELPER_ERRORS.labels(cause=e.__class__.__name__).inc()
+                            raise RaidHelperError(f"Invalid JSON in response: {e}", response.status)
+                        self._store(event_id, response.headers.get('ETag'), payload)
+                        return payload
+
+                    RAID_HELPER_ERRORS.labels(cause=response.status).inc()
+                    last_error = RaidHelperError(f"HTTP {response.status}", response.status)
+                    if response.status not in RETRY_STATUSES:
+                        raise last_error
+                    retry_after = response.headers.get('Retry-After')
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                RAID_HELPER_LATENCY.labels(status=e.__class__.__name__).observe(time.perf_counter() - started)
+                RAID_HELPER_ERRORS.labels(cause=e.__class__.__name__).inc()
+                reason = f"{e.__class__.__name__}: {e}" if str(e) else e.__class__.__name__
+                last_error = RaidHelperError(f"Request failed: {reason}")
+
+            if attempt == self.retries:
+                break
+
+            delay = min(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5), self.timeout)
+            if retry_after is not None:
+                try:
+                    retry_after = float(retry_after)
+                except ValueError:
+                    retry_after = None
+            if retry_after is not None:
+                # Waiting longer than a whole request may take would stall the command
+                if retry_after > self.timeout:
+                    raise RaidHelperError(
+                        f"{last_error}, rate limited for {retry_after:.0f}s", last_error.status
+                    )
+                delay = max(delay, retry_after)
+            logging.warning(f"Raid-Helper request for event {event_id} failed ({last_error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        raise last_error
+
+    def _store(self, event_id: str, etag: str, payload: dict):
+        self._cache[event_id] = (time.monotonic(), etag, payload)
+        self._cache.move_to_end(event_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
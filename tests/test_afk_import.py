@@ -0,0 +1,35 @@
+import json
+import re
+
+import pytest
+
+from afk_import import read_import_file
+
+ROW = {"user_id": "123", "start_date": "01.06", "start_time": "1200", "end_date": "03.06", "end_time": "1800", "reason": "Trip"}
+
+def test_csv_rows_keep_their_line_numbers():
+    data = (
+        "\ufeffuser_id,start_date,start_time,end_date,end_time,reason,clan_role_id\n"
+        "123,01.06,1200,03.06,1800, Trip ,42\n"
+        "456,02.06,0900,02.06,1000,,\n"
+    ).encode("utf-8")
+    assert read_import_file("schedule.CSV", data) == [
+        (2, dict(ROW, clan_role_id="42")),
+        (3, {"user_id": "456", "start_date": "02.06", "start_time": "0900", "end_date": "02.06",
+             "end_time": "1000", "reason": "", "clan_role_id": ""}),
+    ]
+
+def test_json_values_become_strings():
+    data = json.dumps([dict(ROW, user_id=123, reason=None)]).encode("utf-8")
+    assert read_import_file("schedule.json", data) == [(1, dict(ROW, reason=""))]
+
+@pytest.mark.parametrize("filename, data, message", [
+    ("schedule.txt", b"", "must be a .csv or .json"),
+    ("schedule.csv", "user_id".encode("utf-16"), "UTF-8"),
+    ("schedule.json", b"[", "Invalid JSON"),
+    ("schedule.json", b'{"user_id": 1}', "array of objects"),
+    ("schedule.csv", b"user_id,start_date\n1,01.06\n", "Missing column(s): start_time, end_date, end_time, reason"),
+])
+def test_invalid_files_are_rejected(filename, data, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        read_import_file(filename, data)
@@ -0,0 +1,34 @@
+import random
+
+from afk_index import ActiveAfkIndex, AfkEntry
+
+def _entry(entry_id, start, end, clan):
+    return AfkEntry(entry_id, entry_id % 7, "Player", start, end, "Reason", 0, clan)
+
+def test_queries_match_a_linear_scan():
+    rng = random.Random(0)
+    index = ActiveAfkIndex()
+    entries = {}
+    for entry_id in range(1, 400):
+        start = rng.randint(0, 1000)
+        entries[entry_id] = _entry(entry_id, start, start + rng.randint(1, 200), rng.choice([1, 2]))
+        index.add(entries[entry_id])
+    for entry_id in rng.sample(sorted(entries), 100):
+        index.remove(entry_id)
+        del entries[entry_id]
+
+    order = lambda entry: (entry.start_date, entry.end_date, entry.id)
+    for when in range(-10, 1300, 7):
+        for clan in (None, 1, 2):
+            candidates = sorted(
+                (entry for entry in entries.values() if clan is None or entry.clan_role_id == clan), key=order
+            )
+            assert index.active_at(when, clan) == [e for e in candidates if e.start_date <= when < e.end_date]
+            assert index.scheduled_after(when, clan) == [e for e in candidates if e.start_date > when]
+            assert index.current_and_future(when, clan) == [e for e in candidates if e.end_date > when]
+        grouped = index.current_and_future_by_clan(when, [1, 2, 3])
+        assert grouped == {clan: index.current_and_future(when, clan) for clan in (1, 2, 3)}
+
+    ended = index.remove_ended(600)
+    assert sorted(entry.id for entry in ended) == sorted(e.id for e in entries.values() if e.end_date <= 600)
+    assert all(entry.end_date > 600 for entry in index.current_and_future(-1))
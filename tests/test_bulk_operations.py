@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, timedelta
+
+from afk_index import AfkEntry
+from database import Database
+
+def entry(user_id, start, end, clan_role_id):
+    return AfkEntry(None, user_id, f"user{user_id}", int(start.timestamp()), int(end.timestamp()), None, int(time.time()), clan_role_id)
+
+def indexed_ids(db):
+    return sorted(entry.id for entry in db.active_index.current_and_future(0))
+
+def live_ids(db, active_only=True):
+    with db._reader() as conn:
+        sql = "SELECT id FROM afk_users" + (" WHERE is_active = 1" if active_only else "") + " ORDER BY id"
+        return [row[0] for row in conn.execute(sql)]
+
+def test_bulk_changes_keep_statistics_and_index_consistent(tmp_path):
+    db = Database(str(tmp_path / "bulk.db"))
+    try:
+        day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        entries = [
+            entry(1, day, day + timedelta(days=2), 10),
+            entry(1, day + timedelta(days=5), day + timedelta(days=6), 10),
+            entry(2, day + timedelta(days=1), day + timedelta(days=3), 20),
+            entry(3, day + timedelta(days=10), day + timedelta(days=12), 20),
+        ]
+
+        entry_ids = db.import_afk(entries)
+        assert entry_ids == live_ids(db) == indexed_ids(db)
+        assert db.get_afk_statistics(10)[:2] == (2, 1)
+        assert db.get_afk_statistics(20)[:2] == (2, 2)
+        assert db.rebuild_statistics() == []
+
+        # Ending the first three days of clan 20 only touches user 2
+        assert db.end_afk_range(day, day + timedelta(days=3), 20) == 1
+        assert indexed_ids(db) == live_ids(db) == [entry_ids[0], entry_ids[1], entry_ids[3]]
+        assert db.rebuild_statistics() == []
+
+        # Deleting days 5-6 of every clan removes user 1's second entry
+        assert db.delete_afk_range(day + timedelta(days=5), day + timedelta(days=7)) == 1
+        assert indexed_ids(db) == live_ids(db) == [entry_ids[0], entry_ids[3]]
+        assert db.get_afk_statistics(10)[:2] == (1, 1)
+        assert db.rebuild_statistics() == []
+    finally:
+        db.close()
+
+def test_bulk_delete_includes_archived_entries(tmp_path):
+    db = Database(str(tmp_path / "bulk.db"))
+    try:
+        start = datetime.now() - timedelta(days=30)
+        db.import_afk([entry(1, start, start + timedelta(days=2), 10), entry(2, start, start + timedelta(days=2), 10)])
+        db.expire_finished_afk()
+        assert len(db.archive_finished_afk(int(time.time()), batch_size=1)) == 1
+        assert db.get_afk_statistics(10)[:2] == (2, 2)
+
+        assert db.delete_afk_range(start, start + timedelta(days=1)) == 2
+        assert live_ids(db, active_only=False) == []
+        assert db.get_afk_statistics(10)[:2] == (0, 0)
+        assert db.rebuild_statistics() == []
+    finally:
+        db.close()
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+
+from benchmarks.bench_commands import load_bot
+
+def test_command_tree_is_only_synced_when_it_changed(tmp_path, monkeypatch):
+    # load_bot replaces both modules; put back whatever was there before
+    monkeypatch.setitem(sys.modules, "config", None)
+    monkeypatch.setitem(sys.modules, "discord_bot", None)
+    discord_bot = load_bot(str(tmp_path / "bot.db"), None)
+    bot = discord_bot.bot
+
+    syncs = []
+
+    async def sync(guild=None):
+        syncs.append(guild)
+        return bot.tree.get_commands()
+
+    monkeypatch.setattr(bot.tree, "sync", sync)
+    try:
+        asyncio.run(bot.sync_commands())
+        assert syncs == [None]
+        assert os.path.exists(bot.command_hash_file)
+
+        asyncio.run(bot.sync_commands())
+        assert syncs == [None]
+
+        bot.tree.get_command("afk").description = "Changed description"
+        asyncio.run(bot.sync_commands())
+        assert syncs == [None, None]
+    finally:
+        bot.db.close()
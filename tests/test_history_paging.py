@@ -0,0 +1,49 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from afk_index import AfkEntry
+from database import Database
+
+def walk(db, user_id, limit, include_archived):
+    """Page to the oldest entry and back, returning the pages seen each way"""
+    older_pages, newer_pages = [], []
+    rows, older, newer = db.get_user_afk_history_page(user_id, limit, include_archived=include_archived)
+    assert newer is None
+    older_pages.append(rows)
+    while older is not None:
+        rows, older, newer = db.get_user_afk_history_page(user_id, limit, before=older, include_archived=include_archived)
+        older_pages.append(rows)
+    while newer is not None:
+        rows, older, newer = db.get_user_afk_history_page(user_id, limit, after=newer, include_archived=include_archived)
+        newer_pages.append(rows)
+    return older_pages, newer_pages
+
+def test_keyset_pages_cover_the_history_once_in_both_directions(tmp_path):
+    db = Database(str(tmp_path / "history.db"))
+    try:
+        rng = random.Random(0)
+        start = datetime.now() - timedelta(days=100)
+        # Duplicate created_at values make the id part of the cursor matter
+        entries = [
+            AfkEntry(None, 1, "user", int(start.timestamp()), int((start + timedelta(days=1)).timestamp()),
+                     f"entry {number}", rng.randint(0, 5), 10)
+            for number in range(23)
+        ]
+        db.import_afk(entries)
+        db.expire_finished_afk()
+        assert len(db.archive_finished_afk(int(time.time()), batch_size=10)) == 10
+
+        # Archiving walks the primary key, so the ten oldest ids were moved
+        for include_archived in (False, True):
+            visible = entries if include_archived else entries[10:]
+            expected = sorted(visible, key=lambda entry: (entry.created_at, entries.index(entry)), reverse=True)
+            older_pages, newer_pages = walk(db, 1, 5, include_archived)
+
+            assert [row[3] for page in older_pages for row in page] == [entry.reason for entry in expected]
+            assert all(0 < len(page) <= 5 for page in older_pages)
+
+            # Paging back newer retraces the same pages up to the first one
+            assert newer_pages == older_pages[-2::-1]
+    finally:
+        db.close()
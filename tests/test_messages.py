@@ -0,0 +1,43 @@
+import random
+
+from messages import RenderCache, next_change, paginate
+
+def test_oversized_entry_respects_longer_continued_header():
+    pages = paginate(["line\n" * 100], 100, "", "C" * 20)
+    assert all(len(page) <= 100 for page in pages)
+    assert "".join(page[20:] if index else page for index, page in enumerate(pages)) == "line\n" * 100
+
+def test_pages_stay_within_limit_and_keep_content():
+    rng = random.Random(0)
+    for _ in range(500):
+        limit = rng.randint(30, 120)
+        header = "H" * rng.randint(0, 25)
+        continued_header = "C" * rng.randint(0, 25)
+        entries = [
+            "".join("x" * rng.randint(0, 150) + "\n" for _ in range(rng.randint(1, 6)))
+            for _ in range(rng.randint(0, 8))
+        ]
+
+        pages = paginate(entries, limit, header, continued_header)
+
+        assert all(len(page) <= limit for page in pages)
+        assert pages[0].startswith(header)
+        assert all(page.startswith(continued_header) for page in pages[1:])
+        body = pages[0][len(header):] + "".join(page[len(continued_header):] for page in pages[1:])
+        assert body == "".join(entries)
+
+def test_render_cache_misses_after_a_write_or_a_status_change():
+    cache = RenderCache(max_entries=2)
+    rows = [("a", 100, 200), ("b", 50, 300)]
+    valid_until = next_change(rows, 150, 1, 2)
+    assert valid_until == 200
+
+    cache.put("list", 1, valid_until, "rendered")
+    assert cache.get("list", 1, 199) == "rendered"
+    assert cache.get("list", 2, 199) is None
+    assert cache.get("list", 1, 200) is None
+
+    cache.put("forever", 1, None, "x")
+    cache.put("other", 1, None, "y")
+    assert cache.get("list", 1, 0) is None
+    assert (cache.hits, cache.misses) == (1, 3)
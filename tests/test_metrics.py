@@ -0,0 +1,46 @@
+import asyncio
+import logging
+
+from metrics import Counter, Gauge, Histogram, Registry
+
+def test_metadata_names_match_sample_names():
+    registry = Registry()
+    Counter("errors", "Errors", ["command"], registry=registry).labels(command="afk").inc()
+    Gauge("latency_seconds", "Latency", registry=registry).set(0.5)
+    Histogram("duration_seconds", "Duration", buckets=(0.1, 1.0), registry=registry).observe(0.2)
+
+    families = {}
+    for line in registry.render().splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            families[name] = kind
+        elif not line.startswith("#"):
+            sample = line.split("{")[0].split(" ")[0]
+            assert any(
+                sample == name or (kind == "histogram" and sample in (f"{name}_bucket", f"{name}_sum", f"{name}_count"))
+                for name, kind in families.items()
+            ), sample
+
+    assert families == {"errors_total": "counter", "latency_seconds": "gauge", "duration_seconds": "histogram"}
+
+def test_handled_failures_are_logged_as_errors(caplog):
+    from metrics import COMMAND_ERRORS, _timed_callback, command_failed
+
+    class Interaction:
+        command = None
+
+    async def handled(interaction):
+        command_failed(interaction)
+
+    async def succeeded(interaction):
+        pass
+
+    caplog.set_level(logging.INFO)
+    errors = COMMAND_ERRORS.labels(command="unknown")
+    before = errors.value
+    asyncio.run(_timed_callback(handled, "handled")(Interaction()))
+    asyncio.run(_timed_callback(succeeded, "succeeded")(Interaction()))
+
+    statuses = {record.message.split()[1]: record.status for record in caplog.records if hasattr(record, 'status')}
+    assert statuses == {"handled": "error", "succeeded": "ok"}
+    assert errors.value == before + 1
@@ -0,0 +1,75 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from database import MIGRATIONS, Database
+
+def baseline_database(path, rows):
+    """A database as the bot created it before schema versioning: local-time text dates, status indexes"""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE afk_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            display_name TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            reason TEXT,
+            clan_role_id INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            ended_at TEXT DEFAULT NULL,
+            is_active BOOLEAN DEFAULT 1
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_user_status ON afk_users(user_id, is_active)")
+    conn.execute("CREATE INDEX idx_clan_status ON afk_users(clan_role_id, is_active)")
+    conn.executemany('''
+        INSERT INTO afk_users (user_id, display_name, start_date, end_date, reason, clan_role_id, ended_at, is_active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+def test_baseline_database_is_migrated_to_the_latest_schema(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    now = datetime.now().replace(microsecond=0)
+    upcoming = (now + timedelta(days=1), now + timedelta(days=3))
+    finished = (now - timedelta(days=10), now - timedelta(days=5))
+    ended_early = (now - timedelta(days=8), now - timedelta(days=1))
+    baseline_database(path, [
+        (1, "one", str(upcoming[0]), str(upcoming[1]), "Vacation", 10, None, 1),
+        (2, "two", str(finished[0]), str(finished[1]), None, 10, None, 0),
+        # ended_at came from CURRENT_TIMESTAMP, which is UTC
+        (2, "two", str(ended_early[0]), str(ended_early[1]), "Exams", 20, "2024-01-02 03:04:05", 0),
+    ])
+
+    db = Database(path)
+    try:
+        conn = db._writer_conn
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+        rows = conn.execute("SELECT start_date, end_date, ended_at, typeof(created_at) FROM afk_users ORDER BY id").fetchall()
+        assert rows == [
+            (int(upcoming[0].timestamp()), int(upcoming[1].timestamp()), None, "integer"),
+            (int(finished[0].timestamp()), int(finished[1].timestamp()), None, "integer"),
+            (int(ended_early[0].timestamp()), int(ended_early[1].timestamp()), 1704164645, "integer"),
+        ]
+
+        indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert "idx_user_status" not in indexes and "idx_clan_status" not in indexes
+        assert db.check_query_plans() == []
+
+        # Statistics built by the migration match a recount, and the active entry is indexed
+        assert db.rebuild_statistics() == []
+        assert db.get_afk_statistics(10)[:2] == (2, 2)
+        assert [entry.user_id for entry in db.active_index.current_and_future(int(now.timestamp()))] == [1]
+    finally:
+        db.close()
+
+def test_migrations_are_not_applied_twice(tmp_path):
+    path = str(tmp_path / "fresh.db")
+    Database(path).close()
+    db = Database(path)
+    try:
+        assert db._writer_conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    finally:
+        db.close()
@@ -0,0 +1,37 @@
+from database import HOT_QUERIES, Database
+
+def test_hot_queries_use_indexes(tmp_path):
+    """No hot query may scan afk_users without an index or sort through a temporary B-tree"""
+    db = Database(str(tmp_path / "plans.db"))
+    try:
+        assert db.check_query_plans() == []
+    finally:
+        db.close()
+
+def test_plan_check_catches_full_scans(tmp_path, monkeypatch):
+    monkeypatch.setitem(HOT_QUERIES, "unindexed", ("SELECT * FROM afk_users WHERE reason = ?", ("",)))
+    db = Database(str(tmp_path / "plans.db"))
+    try:
+        assert [name for name, _ in db.check_query_plans()] == ["unindexed"]
+    finally:
+        db.close()
+
+def test_every_index_is_used_by_a_hot_query(tmp_path):
+    """Indexes only cost writes unless some hot query plan reads them"""
+    db = Database(str(tmp_path / "plans.db"))
+    try:
+        conn = db._writer_conn
+        indexes = {
+            name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex_%'"
+            )
+        }
+        details = [
+            row[-1]
+            for sql, params in HOT_QUERIES.values()
+            for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        ]
+        used = {name for detail in details for name in detail.split() if name in indexes}
+        assert indexes - used == set()
+    finally:
+        db.close()
@@ -0,0 +1,30 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from afk_retention import RetentionJob
+from database import AsyncDatabase, Database
+
+def test_run_once_archives_every_due_entry_in_batches(tmp_path):
+    db = Database(str(tmp_path / "retention.db"))
+    try:
+        now = datetime.now()
+        # Interleave ended and running entries so every batch has to skip some rows
+        for user_id in range(1, 21):
+            start = now - timedelta(days=30)
+            end = now - timedelta(days=20) if user_id % 3 else now + timedelta(days=1)
+            db.set_afk(user_id, f"user{user_id}", start, end, None, user_id % 2 + 1)
+        db.expire_finished_afk(int(time.time()))
+        statistics = db.get_afk_statistics()
+
+        job = RetentionJob(AsyncDatabase(db), retention_days=10, batch_size=3)
+        archived, _ = asyncio.run(job.run_once())
+
+        with db._reader() as conn:
+            live = conn.execute("SELECT COUNT(*) FROM afk_users").fetchone()[0]
+            archive = conn.execute("SELECT COUNT(*) FROM afk_users_archive").fetchone()[0]
+        assert (archived, live, archive) == (14, 6, 14)
+        assert db.get_afk_statistics() == statistics
+        assert db.rebuild_statistics() == []
+    finally:
+        db.close()
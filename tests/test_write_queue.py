@@ -0,0 +1,36 @@
+import pytest
+
+from database import Database
+
+def insert(conn, user_id):
+    conn.execute(
+        "INSERT INTO afk_users (user_id, display_name, start_date, end_date, reason, clan_role_id, created_at)"
+        " VALUES (?, 'name', 0, 1, NULL, 1, 0)",
+        (user_id,)
+    )
+    return user_id
+
+def insert_then_fail(conn, user_id):
+    insert(conn, user_id)
+    raise ValueError("not a database error")
+
+def test_failing_job_only_rolls_back_itself(tmp_path):
+    db = Database(str(tmp_path / "queue.db"), write_batch_ms=50)
+    try:
+        committed = []
+        futures = [
+            db.write_queue.submit(insert, 1, on_commit=committed.append),
+            db.write_queue.submit(insert_then_fail, 2, on_commit=committed.append),
+            db.write_queue.submit(insert, 3, on_commit=committed.append),
+        ]
+        assert futures[0].result() == 1
+        with pytest.raises(ValueError):
+            futures[1].result()
+        assert futures[2].result() == 3
+        assert committed == [1, 3]
+
+        with db._reader() as conn:
+            rows = conn.execute("SELECT user_id FROM afk_users ORDER BY user_id").fetchall()
+        assert rows == [(1,), (3,)]
+    finally:
+        db.close()